@@ -45,6 +45,7 @@ def main() -> None:
     ap.add_argument("--json", dest="json_path", type=str, default="search_history.json", help="Input history JSON")
     ap.add_argument("--out", dest="out_dir", type=str, default="artifacts", help="Output directory")
     ap.add_argument("--gap-min", dest="gap_minutes", type=int, default=30, help="Session gap in minutes")
+    ap.add_argument("--load-workers", type=int, default=1, help="Worker processes for parsing large exports")
 
     # Config knobs (interpretable)
     ap.add_argument("--seed-psignal-min", type=float, default=0.35)
@@ -53,6 +54,7 @@ def main() -> None:
     ap.add_argument("--max-suits", type=int, default=8)
     ap.add_argument("--session-gate-sim", type=float, default=0.24)
     ap.add_argument("--domain-max-session-frac", type=float, default=0.18)
+    ap.add_argument("--tfidf-dtype", choices=["float64", "float32"], default="float64")
 
     ap.add_argument(
         "--no-llm-judge",
@@ -84,12 +86,13 @@ def main() -> None:
         max_suits=int(args.max_suits),
         session_gate_sim=float(args.session_gate_sim),
         domain_max_session_frac=float(args.domain_max_session_frac),
+        tfidf_dtype=str(args.tfidf_dtype),
     )
 
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    events = load_events(args.json_path)
+    events = load_events(args.json_path, workers=int(args.load_workers))
     events, _ = assign_sessions(events, gap_minutes=int(args.gap_minutes))
 
     qctx = build_query_context(events)
@@ -10,6 +10,9 @@ class SuitConfig:
     # Clustering threshold (cosine on TF-IDF). Higher => fewer, purer suits.
     sim_threshold: float = 0.27
 
+    # Storage dtype of the TF-IDF matrix; "float32" halves similarity memory traffic.
+    tfidf_dtype: str = "float64"
+
     # Pass 2: expansion threshold; lower => more recall.
     expand_sim_threshold: float = 0.18
 
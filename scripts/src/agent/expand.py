@@ -5,11 +5,12 @@ from dataclasses import asdict, dataclass
 from typing import Dict, List, Tuple
 
 import networkx as nx
+import numpy as np
 
 from src.graph.build_graph import MIN_QUERY_QUALITY
 from .config import SuitConfig
 from .suits import ItemInfo, Suit
-from .text import cosine, signature_token_set, item_overlap_score
+from .text import TfidfVectors, cosine_rows, signature_token_set, item_overlap_score
 
 def _dedupe_evidence(evs: List["Evidence"]) -> List["Evidence"]:
     seen: set[str] = set()
@@ -46,45 +47,50 @@ class Evidence:
 def expand_suit(
     G: nx.Graph,
     suit: Suit,
-    vecs: Dict[str, Dict[str, float]],
+    vecs: TfidfVectors,
     item_info: Dict[str, ItemInfo],
     cfg: SuitConfig,
 ) -> Dict[str, object]:
     n_sessions = len([n for n in G.nodes if isinstance(n, str) and n.startswith("s:")])
-    sig = signature_token_set(suit.centroid, k=24)
+    sig = signature_token_set(suit.centroid, vecs.terms, k=24)
+
+    # Affinity of every item to the suit centroid, in vecs row order.
+    sims = cosine_rows(vecs, suit.centroid)
 
     scored_all: List[Tuple[float, str]] = []
-    for item_id, v in vecs.items():
-        sim = cosine(v, suit.centroid)
-        if sim >= cfg.expand_sim_threshold:
-            scored_all.append((float(sim), item_id))
+    for i in np.flatnonzero(sims >= cfg.expand_sim_threshold):
+        scored_all.append((float(sims[i]), vecs.ids[i]))
 
     scored_all.sort(reverse=True, key=lambda t: t[0])
 
+    # primary keeps cosine order; q_primary/d_primary are the same evidence split by kind.
     primary: List[Evidence] = []
+    q_primary: List[Evidence] = []
+    d_primary: List[Evidence] = []
     for sim, item_id in scored_all[:400]:
         x = item_info.get(item_id)
         if not x:
             continue
         if x.kind == "query" and x.qquality < MIN_QUERY_QUALITY:
             continue
-        primary.append(
-            Evidence(
-                item_id=item_id,
-                kind=x.kind,
-                text=x.text,
-                cosine=float(sim),
-                psignal=float(x.psignal),
-                df_sessions=int(x.df_sessions),
-                mass=float(x.mass),
-                reason="semantic-affinity",
-            )
+        ev = Evidence(
+            item_id=item_id,
+            kind=x.kind,
+            text=x.text,
+            cosine=float(sim),
+            psignal=float(x.psignal),
+            df_sessions=int(x.df_sessions),
+            mass=float(x.mass),
+            reason="semantic-affinity",
         )
+        primary.append(ev)
+        if ev.kind == "query":
+            q_primary.append(ev)
+        elif ev.kind == "domain":
+            d_primary.append(ev)
 
     sess_scores: Counter[str] = Counter()
-    for ev in primary:
-        if ev.kind != "query":
-            continue
+    for ev in q_primary:
         for s in _sessions_for_item(G, ev.item_id):
             sess_scores[s] += float(ev.cosine)
 
@@ -101,9 +107,9 @@ def expand_suit(
                 continue
             if x.kind == "query" and x.qquality < MIN_QUERY_QUALITY:
                 continue
-            v = vecs.get(nb) or {}
-            sim = cosine(v, suit.centroid)
-            neigh.append((float(sim), nb))
+            i = vecs.index.get(nb)
+            sim = float(sims[i]) if i is not None else 0.0
+            neigh.append((sim, nb))
 
         for sim, nb in sorted(neigh, reverse=True, key=lambda t: t[0])[: cfg.session_expand_items]:
             x = item_info[nb]
@@ -137,9 +143,6 @@ def expand_suit(
 
     supporting = _dedupe_evidence(supporting)
 
-    q_primary = [e for e in primary if e.kind == "query"]
-    d_primary = [e for e in primary if e.kind == "domain"]
-
     top_queries = [e.text for e in q_primary[: cfg.top_queries_per_suit]]
 
     top_domains = []
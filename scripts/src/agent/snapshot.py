@@ -107,53 +107,78 @@ def _gather_snapshot_queries(expanded: List[dict], G: nx.Graph, *, per_session:
 
     This prevents false "Not enough evidence" when the signal exists but isn't in the top-k list.
     """
+    cap = int(max_total)
     out: List[str] = []
+    # `seen` only grows alongside `out`, so it is bounded by `cap` as well.
     seen: set[str] = set()
 
-    def _add(q: str) -> None:
+    def _add(q: str) -> bool:
+        """Add q if new; return False once the output is at capacity."""
+        if len(out) >= cap:
+            return False
         q = (q or "").strip()
-        if not q:
-            return
-        if q in seen:
-            return
-        seen.add(q)
-        out.append(q)
+        if q and q not in seen:
+            seen.add(q)
+            out.append(q)
+        return len(out) < cap
 
-    for card in expanded:
+    def _add_query_evidence(evs: Iterable[object]) -> bool:
+        for ev in evs:
+            if isinstance(ev, dict) and ev.get("kind") == "query":
+                ps = float(ev.get("psignal", 0.0) or 0.0)
+                if ps >= 0.45 and not _add(ev.get("text") or ""):
+                    return False
+        return True
+
+    def _fill_from_card(card: dict) -> bool:
         for q in (card.get("top_queries") or [])[:60]:
-            _add(q)
+            if not _add(q):
+                return False
 
         # Pull high-psignal query evidence from primary/supporting lists
-        for ev in (card.get("evidence_primary") or []):
-            if isinstance(ev, dict) and ev.get("kind") == "query":
-                ps = float(ev.get("psignal", 0.0) or 0.0)
-                if ps >= 0.45:
-                    _add(ev.get("text") or "")
-        for ev in (card.get("evidence_supporting") or []):
-            if isinstance(ev, dict) and ev.get("kind") == "query":
-                ps = float(ev.get("psignal", 0.0) or 0.0)
-                if ps >= 0.45:
-                    _add(ev.get("text") or "")
+        if not _add_query_evidence(card.get("evidence_primary") or []):
+            return False
+        if not _add_query_evidence(card.get("evidence_supporting") or []):
+            return False
 
         # Pull queries from representative sessions (these often contain long-tail personal signal)
         for sid in (card.get("top_sessions") or [])[:10]:
             s_node = sid
             if isinstance(s_node, str) and not s_node.startswith("s:"):
                 s_node = f"s:{s_node}"
-            if not isinstance(s_node, str) or not G.has_node(s_node):
+            if not isinstance(s_node, str):
                 continue
-            n = 0
-            for nbr in G.neighbors(s_node):
-                if isinstance(nbr, str) and nbr.startswith("q:"):
-                    _add(nbr[2:])
-                    n += 1
-                    if n >= int(per_session):
-                        break
-
-        if len(out) >= int(max_total):
+            for q in _session_queries(s_node):
+                if not _add(q):
+                    return False
+        return True
+
+    # Cards share representative sessions, so each session's query neighbours are
+    # scanned once per call. At least one is taken, even for per_session <= 0.
+    n_per_session = max(1, int(per_session))
+    session_q_neighbors: dict[str, List[str]] = {}
+
+    def _session_queries(s_node: str) -> List[str]:
+        qs = session_q_neighbors.get(s_node)
+        if qs is None:
+            qs = []
+            if G.has_node(s_node):
+                for nbr in G.neighbors(s_node):
+                    if isinstance(nbr, str) and nbr.startswith("q:"):
+                        qs.append(nbr[2:])
+                        if len(qs) >= n_per_session:
+                            break
+            session_q_neighbors[s_node] = qs
+        return qs
+
+    if cap <= 0:
+        return out
+
+    for card in expanded:
+        if not _fill_from_card(card):
             break
 
-    return out[: int(max_total)]
+    return out
 
 
 def _simple_snapshot(expanded: List[dict], G: nx.Graph) -> dict:
@@ -4,10 +4,12 @@ from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
 import networkx as nx
+import numpy as np
+from scipy import sparse
 
 from src.graph.build_graph import MIN_QUERY_QUALITY
 from .config import SuitConfig
-from .text import build_tfidf, cosine, vec_add, vec_scale, top_tokens
+from .text import TfidfVectors, build_tfidf, vec_add, vec_scale, top_tokens
 
 @dataclass
 class ItemInfo:
@@ -24,7 +26,7 @@ class Suit:
     suit_id: int
     label: str
     seed_item_ids: List[str]
-    centroid: Dict[str, float]
+    centroid: sparse.csr_matrix
     mass: float
 
 def _extract_items_from_graph(G: nx.Graph) -> Tuple[Dict[str, ItemInfo], Dict[str, str]]:
@@ -73,9 +75,9 @@ def _seed_score(x: ItemInfo, max_df: int, max_mass: float) -> float:
     mass_n = float(x.mass) / float(max(1e-9, max_mass))
     return float(x.psignal) * 0.5 * (persistence + mass_n)
 
-def discover_suits(G: nx.Graph, cfg: SuitConfig) -> Tuple[List[Suit], Dict[str, Dict[str, float]], Dict[str, ItemInfo]]:
+def discover_suits(G: nx.Graph, cfg: SuitConfig) -> Tuple[List[Suit], TfidfVectors, Dict[str, ItemInfo]]:
     item_info, item_text = _extract_items_from_graph(G)
-    vecs, _idf, _extra_stop = build_tfidf(item_text)
+    vecs, _idf, _extra_stop = build_tfidf(item_text, dtype=cfg.tfidf_dtype)
 
     queries = [x for x in item_info.values() if x.kind == "query"]
     max_df = max([x.df_sessions for x in queries], default=1)
@@ -95,39 +97,61 @@ def discover_suits(G: nx.Graph, cfg: SuitConfig) -> Tuple[List[Suit], Dict[str,
     scored.sort(reverse=True, key=lambda t: t[0])
     scored = scored[: int(cfg.seed_max_items)]
 
+    # Seeds with an empty vector can never join or found a suit.
+    seed_ids = [item_id for _score, item_id in scored if vecs.norms[vecs.index[item_id]] > 0]
+    seed_idx = [vecs.index[item_id] for item_id in seed_ids]
+    seed_rows = vecs.matrix[seed_idx]
+
+    # A centroid is always a weighted sum of its seeds' rows, so seed-vs-suit dot products
+    # are read off the seed Gram matrix instead of re-walking every centroid per seed.
+    gram = (seed_rows @ seed_rows.T).tocsr()
+    seed_sq = vecs.norms[seed_idx] ** 2
+    suit_of = np.full(len(seed_ids), -1, dtype=np.int64)
+    coef = np.zeros(len(seed_ids), dtype=np.float64)
+    cent_sq = np.zeros(len(seed_ids), dtype=np.float64)
+    members: List[List[int]] = []
+
     suits: List[Suit] = []
 
-    for _score, item_id in scored:
-        v = vecs.get(item_id) or {}
-        if not v:
-            continue
+    for i, item_id in enumerate(seed_ids):
+        lo, hi = gram.indptr[i], gram.indptr[i + 1]
+        js = gram.indices[lo:hi]
+        prev = js < i
+        js = js[prev]
+        dots = np.bincount(suit_of[js], weights=coef[js] * gram.data[lo:hi][prev], minlength=len(suits))
 
         best_idx = -1
         best_sim = -1.0
-        for i, suit in enumerate(suits):
-            sim = cosine(v, suit.centroid)
-            if sim > best_sim:
-                best_sim = sim
-                best_idx = i
+        if suits:
+            sims = dots / (np.sqrt(cent_sq[: len(suits)]) * np.sqrt(seed_sq[i]))
+            best_idx = int(np.argmax(sims))
+            best_sim = float(sims[best_idx])
 
         if best_idx >= 0 and best_sim >= cfg.sim_threshold:
             s = suits[best_idx]
-            new_centroid = dict(s.centroid)
-            vec_add(new_centroid, v, w=1.0)
-            # keep your exact original behavior:
-            new_centroid = vec_scale(new_centroid, 1.0 / float(len(s.seed_item_ids) + 1))
+            # keep your exact original behavior: centroid <- (centroid + v) / (n_seeds + 1)
+            scale = 1.0 / float(len(s.seed_item_ids) + 1)
+            coef[members[best_idx]] *= scale
+            coef[i] = scale
+            cent_sq[best_idx] = (cent_sq[best_idx] + 2.0 * dots[best_idx] + seed_sq[i]) * scale * scale
+            members[best_idx].append(i)
+            suit_of[i] = best_idx
 
             s.seed_item_ids.append(item_id)
-            s.centroid = new_centroid
             s.mass += float(item_info[item_id].mass)
         else:
-            label = " ".join(top_tokens(v, 4)) or "misc"
+            v = vecs.row(item_id)
+            label = " ".join(top_tokens(v, vecs.terms, 4)) or "misc"
+            coef[i] = 1.0
+            cent_sq[len(suits)] = seed_sq[i]
+            suit_of[i] = len(suits)
+            members.append([i])
             suits.append(
                 Suit(
                     suit_id=len(suits),
                     label=label.title(),
                     seed_item_ids=[item_id],
-                    centroid=dict(v),
+                    centroid=v,
                     mass=float(item_info[item_id].mass),
                 )
             )
@@ -136,5 +160,10 @@ def discover_suits(G: nx.Graph, cfg: SuitConfig) -> Tuple[List[Suit], Dict[str,
     suits = suits[: int(cfg.max_suits)]
     for i, s in enumerate(suits):
         s.suit_id = int(i)
+        # Only the surviving suits need their centroid vector materialized.
+        centroid = vecs.row(s.seed_item_ids[0])
+        for n, item_id in enumerate(s.seed_item_ids[1:], start=1):
+            centroid = vec_scale(vec_add(centroid, vecs.row(item_id), w=1.0), 1.0 / float(n + 1))
+        s.centroid = centroid
 
     return suits, vecs, item_info
\ No newline at end of file
@@ -1,21 +1,24 @@
 from __future__ import annotations
 
-import math
 import re
 from collections import Counter
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+from scipy import sparse
+
 _STOP = {
     "the", "a", "an", "and", "or", "to", "of", "in", "for", "on", "at", "near", "me",
     "is", "are", "was", "were", "be", "with", "from", "by",
 }
 
+_TOK_RE = re.compile(r"[a-z0-9]+")
+
 def tokens(text: str, *, extra_stop: Optional[set[str]] = None, use_bigrams: bool = True) -> List[str]:
     s = (text or "").lower()
-    xs = re.findall(r"[a-z0-9]+", s)
-    stop = set(_STOP)
-    if extra_stop:
-        stop |= set(extra_stop)
+    xs = _TOK_RE.findall(s)
+    stop = _STOP | set(extra_stop) if extra_stop else _STOP
 
     toks = [t for t in xs if t and t not in stop and len(t) >= 2]
 
@@ -30,7 +33,34 @@ def tokens(text: str, *, extra_stop: Optional[set[str]] = None, use_bigrams: boo
         bigrams.append(f"{a}_{b}")
     return toks + bigrams
 
-def build_tfidf(items: Dict[str, str]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, float], set[str]]:
+@dataclass
+class TfidfVectors:
+    """TF-IDF rows for a set of items, stored as one CSR matrix (items x vocab)."""
+
+    ids: List[str]
+    index: Dict[str, int]
+    terms: List[str]
+    idf: np.ndarray
+    matrix: sparse.csr_matrix
+    norms: np.ndarray  # L2 norm per row, cached at build time
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self.index
+
+    def row(self, item_id: str) -> Optional[sparse.csr_matrix]:
+        """1 x V view of an item's vector (None if the item is unknown)."""
+        i = self.index.get(item_id)
+        if i is None:
+            return None
+        return self.matrix[i]
+
+def build_tfidf(items: Dict[str, str], *, dtype: str = "float64") -> Tuple[TfidfVectors, np.ndarray, set[str]]:
+    """TF-IDF rows for `items`. `dtype` is the storage type of the matrix values: "float32"
+    halves the bytes every similarity product streams, at ~1e-7 relative error. (float16 is
+    not offered: scipy's sparse kernels would upcast it on every product.)"""
     N = max(1, len(items))
     extra_stop: set[str] = set()
 
@@ -45,62 +75,73 @@ def build_tfidf(items: Dict[str, str]) -> Tuple[Dict[str, Dict[str, float]], Dic
     #         continue
     #     extra_stop.add(tok)
 
-    tfs: Dict[str, Counter[str]] = {}
-    df: Counter[str] = Counter()
+    # One pass: encode tokens against a global vocab and lay rows out as CSR (tf only).
+    vocab: Dict[str, int] = {}
+    ids: List[str] = []
+    indptr: List[int] = [0]
+    indices: List[int] = []
+    tf_data: List[float] = []
     for item_id, text in items.items():
-        toks = tokens(text, extra_stop=None, use_bigrams=True)
-        c = Counter(toks)
-        tfs[item_id] = c
-        for tok in set(c.keys()):
-            df[tok] += 1
-
-    idf: Dict[str, float] = {}
-    for tok, dfi in df.items():
-        idf[tok] = math.log((N + 1.0) / (dfi + 1.0)) + 1.0
-
-    vecs: Dict[str, Dict[str, float]] = {}
-    for item_id, c in tfs.items():
-        out: Dict[str, float] = {}
+        c = Counter(tokens(text, extra_stop=None, use_bigrams=True))
         denom = float(sum(c.values())) or 1.0
         for tok, tf in c.items():
-            tf_n = float(tf) / denom
-            out[tok] = tf_n * idf.get(tok, 1.0)
-        vecs[item_id] = out
-
+            indices.append(vocab.setdefault(tok, len(vocab)))
+            tf_data.append(float(tf) / denom)
+        indptr.append(len(indices))
+        ids.append(item_id)
+
+    col = np.asarray(indices, dtype=np.int32)
+    df = np.bincount(col, minlength=len(vocab)).astype(np.float64)
+    idf = np.log((N + 1.0) / (df + 1.0)) + 1.0
+
+    data = (np.asarray(tf_data, dtype=np.float64) * idf[col]).astype(dtype, copy=False)
+    matrix = sparse.csr_matrix((data, col, np.asarray(indptr, dtype=np.int32)), shape=(len(ids), len(vocab)))
+    matrix.sort_indices()
+
+    terms = [""] * len(vocab)
+    for tok, j in vocab.items():
+        terms[j] = tok
+
+    vecs = TfidfVectors(
+        ids=ids,
+        index={item_id: i for i, item_id in enumerate(ids)},
+        terms=terms,
+        idf=idf,
+        matrix=matrix,
+        norms=row_norms(matrix),
+    )
     return vecs, idf, extra_stop
 
-def norm(v: Dict[str, float]) -> float:
-    return math.sqrt(sum(x * x for x in v.values()))
-
-def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
-    if not a or not b:
-        return 0.0
-    na = norm(a)
-    nb = norm(b)
-    if na <= 0 or nb <= 0:
-        return 0.0
-    if len(a) > len(b):
-        a, b = b, a
-    dot = 0.0
-    for k, va in a.items():
-        vb = b.get(k)
-        if vb is not None:
-            dot += va * vb
-    return float(dot / (na * nb))
-
-def vec_add(acc: Dict[str, float], v: Dict[str, float], w: float = 1.0) -> None:
-    for k, x in v.items():
-        acc[k] = acc.get(k, 0.0) + float(w) * float(x)
-
-def vec_scale(v: Dict[str, float], s: float) -> Dict[str, float]:
-    return {k: float(x) * float(s) for k, x in v.items()}
-
-def top_tokens(v: Dict[str, float], k: int = 4) -> List[str]:
-    return [t for t, _ in sorted(v.items(), key=lambda kv: kv[1], reverse=True)[:k]]
-
-def signature_token_set(centroid: Dict[str, float], k: int = 24) -> set[str]:
-    return set(top_tokens(centroid, k=k))
+def norm(v: sparse.csr_matrix) -> float:
+    d = v.data.astype(np.float64, copy=False)
+    return float(np.sqrt(np.dot(d, d)))
+
+def row_norms(m: sparse.csr_matrix) -> np.ndarray:
+    return np.sqrt(np.asarray(m.multiply(m).sum(axis=1, dtype=np.float64)).ravel())
+
+def _divide_by_norms(dots: np.ndarray, denom: np.ndarray) -> np.ndarray:
+    out = np.zeros(dots.shape, dtype=np.float64)
+    np.divide(dots, denom, out=out, where=denom > 0)
+    return out
+
+def cosine_rows(vecs: TfidfVectors, v: sparse.csr_matrix) -> np.ndarray:
+    """Cosine of every item in `vecs` against the single row `v` (one sparse mat-vec)."""
+    dots = np.asarray((vecs.matrix @ v.T).todense()).ravel()
+    return _divide_by_norms(dots, vecs.norms * norm(v))
+
+def vec_add(acc: sparse.csr_matrix, v: sparse.csr_matrix, w: float = 1.0) -> sparse.csr_matrix:
+    return acc + v * float(w)
+
+def vec_scale(v: sparse.csr_matrix, s: float) -> sparse.csr_matrix:
+    return v * float(s)
+
+def top_tokens(v: sparse.csr_matrix, terms: List[str], k: int = 4) -> List[str]:
+    order = np.argsort(-v.data, kind="stable")[:k]
+    return [terms[v.indices[i]] for i in order]
+
+def signature_token_set(centroid: sparse.csr_matrix, terms: List[str], k: int = 24) -> set[str]:
+    return set(top_tokens(centroid, terms, k=k))
 
 def item_overlap_score(item_text: str, sig: set[str]) -> int:
     toks = set(tokens(item_text, extra_stop=None, use_bigrams=True))
-    return int(len(toks & sig))
\ No newline at end of file
+    return int(len(toks & sig))
@@ -0,0 +1,77 @@
+"""_query_scoring.py
+
+What it does:
+- Holds the Phase-1 query/domain scoring policy shared by the graph modules: the query quality
+  heuristic, the psignal -> qclass split, and the hub-domain / min-quality thresholds.
+
+Notes:
+- Regexes are compiled and `query_quality` is memoized once here; `build_graph` re-exports
+  the names it has always exposed.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+import re
+
+
+# -----------------------------
+# Phase-1 graph policy
+# -----------------------------
+
+MIN_QUERY_QUALITY = 0.25
+
+HUB_DOMAINS = {
+    "google.com",
+    "youtube.com",
+    "wikipedia.org",
+}
+
+
+_WS_RE = re.compile(r"\s+")
+_SHORT_ALPHA_RE = re.compile(r"[a-z]{1,2}")
+
+
+# The same query string recurs across events and sessions; scoring is pure, so memoize it.
+@lru_cache(maxsize=100_000)
+def query_quality(q: str) -> float:
+    """Heuristic query quality in [0,1]. Low => fragment / mostly numeric / junk."""
+    qq = (q or "").strip().lower()
+    if not qq:
+        return 0.0
+
+    qq = _WS_RE.sub(" ", qq).strip()
+
+    # too short / fragments
+    if len(qq) <= 1:
+        return 0.0
+    if len(qq) <= 2:
+        return 0.10
+
+    toks = [t for t in qq.split() if t]
+    if not toks:
+        return 0.0
+
+    # penalize mostly-numeric
+    alpha = sum(ch.isalpha() for ch in qq)
+    if alpha / max(1, len(qq)) < 0.30:
+        return 0.25
+
+    score = 0.55
+    if len(qq) >= 8:
+        score += 0.15
+    if len(toks) >= 2:
+        score += 0.15
+    if len(toks) >= 3:
+        score += 0.05
+
+    if _SHORT_ALPHA_RE.fullmatch(qq):
+        score -= 0.35
+
+    return float(max(0.0, min(1.0, score)))
+
+
+def qclass_from_psignal(ps: float) -> str:
+    """Data-driven: low psignal behaves like "utility/admin-like" (not dropped, just de-emphasized)."""
+    return "utility" if float(ps) < 0.30 else "interest"
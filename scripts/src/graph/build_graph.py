@@ -21,77 +21,66 @@ from collections import Counter, defaultdict
 from typing import Dict, List, Tuple
 
 import math
-import re
+import sys
 
 import networkx as nx
+import numpy as np
 
 from src.ingest.parse_takeout import Event
 
+# Phase-1 graph policy lives in _query_scoring; MIN_QUERY_QUALITY/HUB_DOMAINS stay importable here.
+from src.graph._query_scoring import (
+    HUB_DOMAINS,
+    MIN_QUERY_QUALITY,
+    qclass_from_psignal as _qclass_from_psignal,
+    query_quality as _query_quality,
+)
 
-# -----------------------------
-# Phase-1 graph policy
-# -----------------------------
 
-MIN_QUERY_QUALITY = 0.25
+def _tile_pairs(n_outer: np.ndarray, n_inner: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Flat (outer, inner) positions of every per-session tile, in `for outer: for inner:` order.
 
-HUB_DOMAINS = {
-    "google.com",
-    "youtube.com",
-    "wikipedia.org",
-}
-
-
-def _query_quality(q: str) -> float:
-    """Heuristic query quality in [0,1]. Low => fragment / mostly numeric / junk."""
-    qq = (q or "").strip().lower()
-    if not qq:
-        return 0.0
-
-    qq = re.sub(r"\s+", " ", qq).strip()
-
-    # too short / fragments
-    if len(qq) <= 1:
-        return 0.0
-    if len(qq) <= 2:
-        return 0.10
-
-    toks = [t for t in qq.split() if t]
-    if not toks:
-        return 0.0
-
-    # penalize mostly-numeric
-    alpha = sum(ch.isalpha() for ch in qq)
-    if alpha / max(1, len(qq)) < 0.30:
-        return 0.25
+    Tile t pairs the n_outer[t] outer entries with the n_inner[t] inner entries of session t;
+    positions index the concatenation of all sessions' outer (resp. inner) entries.
+    """
+    n_pairs = n_outer * n_inner
+    t = np.repeat(np.arange(len(n_pairs)), n_pairs)
+    k = np.arange(int(n_pairs.sum())) - (np.cumsum(n_pairs) - n_pairs)[t]
+    outer = (np.cumsum(n_outer) - n_outer)[t] + k // n_inner[t]
+    inner = (np.cumsum(n_inner) - n_inner)[t] + k % n_inner[t]
+    return outer, inner
 
-    score = 0.55
-    if len(qq) >= 8:
-        score += 0.15
-    if len(toks) >= 2:
-        score += 0.15
-    if len(toks) >= 3:
-        score += 0.05
 
-    if re.fullmatch(r"[a-z]{1,2}", qq):
-        score -= 0.35
+def _top_k_per_session(session_ctrs: Dict[str, Counter[str]], k: int) -> Dict[str, List[Tuple[str, int]]]:
+    """`ctr.most_common(k)` for every session at once.
 
-    return float(max(0.0, min(1.0, score)))
+    All (session, item, count) entries are ranked by one stable lexsort (session, -count), so
+    ties keep Counter insertion order exactly like `most_common`.
+    """
+    sessions: List[str] = []
+    flat_rows: List[int] = []
+    flat_items: List[Tuple[str, int]] = []
+    for r, (s, ctr) in enumerate(session_ctrs.items()):
+        sessions.append(s)
+        flat_rows.extend([r] * len(ctr))
+        flat_items.extend(ctr.items())
 
+    out: Dict[str, List[Tuple[str, int]]] = {s: [] for s in sessions}
+    if not flat_items:
+        return out
 
-def _entropy(ctr: Counter[str]) -> float:
-    tot = float(sum(ctr.values()))
-    if tot <= 0:
-        return 0.0
-    h = 0.0
-    for c in ctr.values():
-        p = float(c) / tot
-        h -= p * math.log(p + 1e-12)
-    return float(h)
+    rows = np.asarray(flat_rows, dtype=np.int64)
+    counts = np.fromiter((c for _x, c in flat_items), dtype=np.int64, count=len(flat_items))
+    order = np.lexsort((-counts, rows))
 
+    # rank of each sorted entry within its session
+    rows_sorted = rows[order]
+    starts = np.flatnonzero(np.r_[True, rows_sorted[1:] != rows_sorted[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
 
-def _qclass_from_psignal(ps: float) -> str:
-    """Data-driven: low psignal behaves like "utility/admin-like" (not dropped, just de-emphasized)."""
-    return "utility" if float(ps) < 0.30 else "interest"
+    for i in order[rank < k].tolist():
+        out[sessions[flat_rows[i]]].append(flat_items[i])
+    return out
 
 
 def build_history_graph(events: List[Event]) -> nx.Graph:
@@ -117,17 +106,22 @@ def build_history_graph(events: List[Event]) -> nx.Graph:
     # Aggregate within session
     session_domains: Dict[str, Counter[str]] = defaultdict(Counter)
     session_queries: Dict[str, Counter[str]] = defaultdict(Counter)
-    all_sessions: set[str] = set()
 
-    for e in events:
-        sid = e.id.split(":", 1)[0]
-        all_sessions.add(sid)
+    # Explode the events into the three columns used here once; each pass below zips only
+    # the two it needs instead of re-reading whole Event objects.
+    ev_sids = [e.session_id or e.id.split(":", 1)[0] for e in events]
+    ev_domains = [e.domain for e in events]
+    ev_queries = [e.query for e in events]
+
+    all_sessions: set[str] = set(ev_sids)
 
-        if e.domain:
-            session_domains[sid][e.domain] += 1
+    for sid, d in zip(ev_sids, ev_domains):
+        if d:
+            session_domains[sid][d] += 1
 
-        if e.query:
-            session_queries[sid][e.query] += 1
+    for sid, q in zip(ev_sids, ev_queries):
+        if q:
+            session_queries[sid][q] += 1
 
     n_sessions = max(1, len(all_sessions))
 
@@ -137,20 +131,12 @@ def build_history_graph(events: List[Event]) -> nx.Graph:
         for d in dctr.keys():
             domain_df[d] += 1
 
-    def domain_idf(d: str) -> float:
-        df = domain_df.get(d, 0)
-        return math.log((1.0 + n_sessions) / (1.0 + df)) + 1.0
-
     # Query DF / IDF across sessions (all queries)
     query_df: Counter[str] = Counter()
     for _s, qctr in session_queries.items():
         for q in qctr.keys():
             query_df[q] += 1
 
-    def query_idf(q: str) -> float:
-        df = query_df.get(q, 0)
-        return math.log((1.0 + n_sessions) / (1.0 + df)) + 1.0
-
     # -----------------------------
     # Unsupervised psignal per query (user-only)
     # -----------------------------
@@ -164,129 +150,220 @@ def build_history_graph(events: List[Event]) -> nx.Graph:
     for _s, _qctr in session_queries.items():
         query_total.update(_qctr)
 
-    # query -> Counter(domain -> cooccur count)
-    query_domain_counts: Dict[str, Counter[str]] = defaultdict(Counter)
+    # Top domains/queries per session, ranked once and shared by the psignal and domain-query passes
+    TOP_DOMAINS_PER_SESSION = 10
+    TOP_QUERIES_PER_SESSION = 10
+    top_domains = _top_k_per_session(session_domains, TOP_DOMAINS_PER_SESSION)
+    top_queries = _top_k_per_session(session_queries, TOP_QUERIES_PER_SESSION)
+
+    queries = list(query_df.keys())
+    q_row = {q: i for i, q in enumerate(queries)}
+    domains = list(domain_df.keys())
+    d_row = {d: i for i, d in enumerate(domains)}
+
+    # (query, domain) co-occurrence counts: every query of a session against its top domains,
+    # as one (queries x top domains) tile per session summed with min(qc, dc).
+    co_q: List[int] = []
+    co_qc: List[int] = []
+    co_d: List[int] = []
+    co_dc: List[int] = []
+    co_nq: List[int] = []
+    co_nd: List[int] = []
     for sid in all_sessions:
-        doms = session_domains.get(sid, Counter()).most_common(10)
-        qctr = session_queries.get(sid, Counter())
+        doms = top_domains.get(sid, [])
+        qctr = session_queries.get(sid)
         if not doms or not qctr:
             continue
         for q, qc in qctr.items():
-            for d, dc in doms:
-                query_domain_counts[q][d] += int(min(qc, dc))
-
-    query_psignal: Dict[str, float] = {}
-    for q in query_df.keys():
-        df = max(1, int(query_df.get(q, 1)))
-        idf = float(query_idf(q))
-        qqual = float(_query_quality(q))
-
-        # repeats per session where it appears (burstiness)
-        burst = float(query_total.get(q, 0)) / float(df)
-
-        # Normalize pieces to ~[0,1] in monotone, interpretable ways
-        idf_n = 1.0 - math.exp(-0.7 * max(0.0, idf - 1.0))
-
-        dom_ctr = query_domain_counts.get(q, Counter())
-        ent = float(_entropy(dom_ctr))
-        ent_max = math.log(float(max(1, len(dom_ctr)))) if len(dom_ctr) > 1 else 0.0
-        ent_n = (ent / ent_max) if ent_max > 0 else 0.0
-        ent_n = float(max(0.0, min(1.0, ent_n)))
-
-        # Burstiness: higher burst => lower signal
-        burst_n = 1.0 - 1.0 / (1.0 + math.log1p(max(0.0, burst)))
-        burst_keep = float(max(0.0, min(1.0, 1.0 - burst_n)))
-
-        raw = (0.55 * idf_n + 0.25 * ent_n + 0.20 * burst_keep) * qqual
-        query_psignal[q] = float(max(0.0, min(1.0, raw)))
-
-    # Weighted edges
-    w_sd: Counter[Tuple[str, str]] = Counter()
-    w_sq: Counter[Tuple[str, str]] = Counter()
-    w_dq: Counter[Tuple[str, str]] = Counter()
-
-    # session-domain edges
+            co_q.append(q_row[q])
+            co_qc.append(qc)
+        for d, dc in doms:
+            co_d.append(d_row[d])
+            co_dc.append(dc)
+        co_nq.append(len(qctr))
+        co_nd.append(len(doms))
+
+    pq, pd = _tile_pairs(np.asarray(co_nq, dtype=np.int64), np.asarray(co_nd, dtype=np.int64))
+    pair_q = np.asarray(co_q, dtype=np.int64)[pq]
+    pair_key = pair_q * len(domains) + np.asarray(co_d, dtype=np.int64)[pd]
+    pair_co = np.minimum(np.asarray(co_qc, dtype=np.int64)[pq], np.asarray(co_dc, dtype=np.int64)[pd])
+    _keys, first, inv = np.unique(pair_key, return_index=True, return_inverse=True)
+    qd_count = np.bincount(inv, weights=pair_co.astype(np.float64), minlength=len(first))
+
+    # Order the distinct pairs like the nested query -> domain Counter this replaces: queries
+    # by first appearance, then domains by first appearance within the query.
+    qd_q = pair_q[first]
+    q_first = np.full(len(queries), len(pair_key), dtype=np.int64)
+    np.minimum.at(q_first, qd_q, first)
+    qd_order = np.lexsort((first, q_first[qd_q]))
+
+    # Per-query columns (parallel to `queries`), so every psignal term is one array expression.
+    q_df = np.fromiter((query_df[q] for q in queries), dtype=np.float64, count=len(queries))
+    q_total = np.fromiter((query_total.get(q, 0) for q in queries), dtype=np.float64, count=len(queries))
+    q_qual = np.fromiter((_query_quality(q) for q in queries), dtype=np.float64, count=len(queries))
+    # Transcendentals go through math (libm), not np.log/np.exp/np.log1p: NumPy's vectorized
+    # routines can differ from libm in the last bit, and psignal / edge weights are meant to match
+    # the scalar formulas exactly. IDF and its normalization only depend on the integer df, so
+    # they are per-df lookup tables.
+    idf_of_df = np.asarray(
+        [math.log((1.0 + n_sessions) / (1.0 + df)) + 1.0 for df in range(n_sessions + 1)], dtype=np.float64
+    )
+    q_df_i = q_df.astype(np.int64)
+    q_idf = idf_of_df[q_df_i]
+
+    # Domain entropy per query from the (query, domain, count) triples.
+    rows = qd_q[qd_order]
+    counts = qd_count[qd_order]
+    n_doms = np.bincount(rows, minlength=len(queries))
+    row_tot = np.bincount(rows, weights=counts, minlength=len(queries))
+    p = counts / row_tot[rows] if len(rows) else counts
+    log_p = np.fromiter(map(math.log, (p + 1e-12).tolist()), dtype=np.float64, count=len(p))
+    ent = np.bincount(rows, weights=-p * log_p, minlength=len(queries))
+    log_of_n = np.asarray([0.0] + [math.log(float(k)) for k in range(1, int(n_doms.max(initial=0)) + 1)])
+    ent_max = np.where(n_doms > 1, log_of_n[n_doms], 0.0)
+    ent_n = np.clip(np.divide(ent, ent_max, out=np.zeros(len(queries)), where=ent_max > 0), 0.0, 1.0)
+
+    # Normalize pieces to ~[0,1] in monotone, interpretable ways
+    idf_n_of_df = np.asarray([1.0 - math.exp(-0.7 * max(0.0, idf - 1.0)) for idf in idf_of_df.tolist()])
+    idf_n = idf_n_of_df[q_df_i]
+
+    # Burstiness (repeats per session where it appears): higher burst => lower signal
+    burst = q_total / np.maximum(1.0, q_df)
+    log1p_burst = np.fromiter(map(math.log1p, np.maximum(0.0, burst).tolist()), dtype=np.float64, count=len(queries))
+    burst_n = 1.0 - 1.0 / (1.0 + log1p_burst)
+    burst_keep = np.clip(1.0 - burst_n, 0.0, 1.0)
+
+    raw = (0.55 * idf_n + 0.25 * ent_n + 0.20 * burst_keep) * q_qual
+    q_ps = np.clip(raw, 0.0, 1.0)
+
+    # IDF / quality / psignal as flat per-id tables, computed once and gathered by the edge loops.
+    d_df = np.fromiter((domain_df[d] for d in domains), dtype=np.int64, count=len(domains))
+    d_idf = idf_of_df[d_df]  # same libm table as the query IDF
+    qqual_arr = q_qual.tolist()
+    ps_arr = q_ps.tolist()
+
+    # Weighted edges, keyed by integer (row, row) pairs into `sessions` / `domains` / `queries`;
+    # node names are only built at materialization.
+    sessions = list(all_sessions)
+    s_row = {s: i for i, s in enumerate(sessions)}
+
+    # session-domain and session-query edges (all queries; low-psignal is de-emphasized, not
+    # dropped). Every (session, item) pair occurs once since the per-session Counters are
+    # already aggregated, so the pairs are laid out flat and weighted in one array expression.
+    sd_s: List[int] = []
+    sd_d: List[int] = []
+    sd_c: List[int] = []
     for s, dctr in session_domains.items():
-        sn = f"s:{s}"
+        si = s_row[s]
         for d, c in dctr.items():
-            dn = f"d:{d}"
-            if d in HUB_DOMAINS:
-                w = math.log1p(c) * domain_idf(d) * 0.15
-            else:
-                w = math.log1p(c) * domain_idf(d) * 0.90
-            w_sd[(sn, dn)] += float(w)
-
-    # session-query edges (all queries; low-psignal is de-emphasized, not dropped)
+            sd_s.append(si)
+            sd_d.append(d_row[d])
+            sd_c.append(c)
+
+    sq_s: List[int] = []
+    sq_q: List[int] = []
+    sq_c: List[int] = []
     for s, qctr in session_queries.items():
-        sn = f"s:{s}"
+        si = s_row[s]
         for q, c in qctr.items():
-            qqual = _query_quality(q)
-            if qqual < MIN_QUERY_QUALITY:
+            qi = q_row[q]
+            if qqual_arr[qi] < MIN_QUERY_QUALITY:
                 continue
-            ps = float(query_psignal.get(q, 0.0))
-            qn = f"q:{q}"
-            w = math.log1p(c) * query_idf(q) * qqual * (0.20 + 0.80 * ps)
-            w_sq[(sn, qn)] += float(w)
-
-    # domain-query co-occurrence within session
-    TOP_DOMAINS_PER_SESSION = 10
-    TOP_QUERIES_PER_SESSION = 10
+            sq_s.append(si)
+            sq_q.append(qi)
+            sq_c.append(c)
+
+    # log1p of the (small, integer) counts from a math.log1p table, so weights match the
+    # scalar formula bit for bit.
+    log1p_of = np.asarray([math.log1p(c) for c in range(max(sd_c + sq_c, default=0) + 1)], dtype=np.float64)
+
+    d_hub_scale = np.fromiter(
+        (0.15 if d in HUB_DOMAINS else 0.90 for d in domains), dtype=np.float64, count=len(domains)
+    )
+    sd_di = np.asarray(sd_d, dtype=np.int64)
+    sd_w = log1p_of[np.asarray(sd_c, dtype=np.int64)] * d_idf[sd_di] * d_hub_scale[sd_di]
+    w_sd: Dict[Tuple[int, int], float] = dict(zip(zip(sd_s, sd_d), sd_w.tolist()))
+
+    sq_qi = np.asarray(sq_q, dtype=np.int64)
+    sq_w = log1p_of[np.asarray(sq_c, dtype=np.int64)] * q_idf[sq_qi] * q_qual[sq_qi] * (0.20 + 0.80 * q_ps[sq_qi])
+    w_sq: Dict[Tuple[int, int], float] = dict(zip(zip(sq_s, sq_q), sq_w.tolist()))
+
+    # domain-query co-occurrence within session, as one (top domains x top queries) tile per
+    # session: collect each session's kept domain/query ids, expand every tile into flat
+    # (domain, query) pair arrays in loop order, and weight all pairs in one array expression.
+    tile_d: List[int] = []
+    tile_dc: List[int] = []
+    tile_q: List[int] = []
+    tile_qc: List[int] = []
+    tile_nd: List[int] = []
+    tile_nq: List[int] = []
     for s in all_sessions:
-        doms = session_domains.get(s, Counter()).most_common(TOP_DOMAINS_PER_SESSION)
-        qs = session_queries.get(s, Counter()).most_common(TOP_QUERIES_PER_SESSION)
-
-        for d, dc in doms:
-            if d in HUB_DOMAINS:
-                continue
-            dn = f"d:{d}"
-            d_w = domain_idf(d)
-
-            for q, qc in qs:
-                qqual = _query_quality(q)
-                if qqual < MIN_QUERY_QUALITY:
-                    continue
-                ps = float(query_psignal.get(q, 0.0))
-                qn = f"q:{q}"
-
-                w = float(min(dc, qc)) * d_w * query_idf(q) * qqual * (0.20 + 0.80 * ps) * 0.65
-                w_dq[(dn, qn)] += float(w)
-
-    # Materialize nodes/edges
-    for s in all_sessions:
-        G.add_node(f"s:{s}", ntype="session")
-
-    for (u, v), w in w_sd.items():
-        G.add_node(u, ntype="session")
-        G.add_node(v, ntype="domain")
-        G.add_edge(u, v, weight=float(w), etype="session-domain")
-
-    for (u, v), w in w_sq.items():
-        q_text = v.split(":", 1)[1] if ":" in v else v
-        qqual = _query_quality(q_text)
-        ps = float(query_psignal.get(q_text, 0.0))
-        qclass = _qclass_from_psignal(ps)
-
-        G.add_node(u, ntype="session")
-        G.add_node(v, ntype="query", qclass=qclass, qquality=float(qqual), psignal=float(ps))
-
-        if G.has_edge(u, v):
-            G[u][v]["weight"] += float(w)
-        else:
-            G.add_edge(u, v, weight=float(w), etype="session-query")
-
-    for (u, v), w in w_dq.items():
-        q_text = v.split(":", 1)[1] if ":" in v else v
-        qqual = _query_quality(q_text)
-        ps = float(query_psignal.get(q_text, 0.0))
-        qclass = _qclass_from_psignal(ps)
-
-        G.add_node(u, ntype="domain")
-        G.add_node(v, ntype="query", qclass=qclass, qquality=float(qqual), psignal=float(ps))
-
-        if G.has_edge(u, v):
-            G[u][v]["weight"] += float(w)
-        else:
-            G.add_edge(u, v, weight=float(w), etype="domain-query")
+        doms = [(d_row[d], dc) for d, dc in top_domains.get(s, []) if d not in HUB_DOMAINS]
+        qs = [(q_row[q], qc) for q, qc in top_queries.get(s, []) if qqual_arr[q_row[q]] >= MIN_QUERY_QUALITY]
+        if not doms or not qs:
+            continue
+        for di, dc in doms:
+            tile_d.append(di)
+            tile_dc.append(dc)
+        for qi, qc in qs:
+            tile_q.append(qi)
+            tile_qc.append(qc)
+        tile_nd.append(len(doms))
+        tile_nq.append(len(qs))
+
+    w_dq: Dict[Tuple[int, int], float] = {}
+    if tile_nd:
+        pd, pq = _tile_pairs(np.asarray(tile_nd, dtype=np.int64), np.asarray(tile_nq, dtype=np.int64))
+        d_ids = np.asarray(tile_d, dtype=np.int64)[pd]
+        q_ids = np.asarray(tile_q, dtype=np.int64)[pq]
+        co = np.minimum(np.asarray(tile_dc, dtype=np.int64)[pd], np.asarray(tile_qc, dtype=np.int64)[pq])
+        w = co.astype(np.float64) * d_idf[d_ids] * q_idf[q_ids] * q_qual[q_ids] * (0.20 + 0.80 * q_ps[q_ids]) * 0.65
+
+        # Sum repeated (domain, query) pairs in loop order (np.add.at is unbuffered and
+        # sequential), keyed in first-seen order like the dict accumulation it replaces.
+        pair_key = d_ids * len(queries) + q_ids
+        _keys, first, inv = np.unique(pair_key, return_index=True, return_inverse=True)
+        acc = np.zeros(len(first), dtype=np.float64)
+        np.add.at(acc, inv, w)
+        acc_w = acc.tolist()
+        first_d = d_ids[first].tolist()
+        first_q = q_ids[first].tolist()
+        for j in np.argsort(first, kind="stable").tolist():
+            w_dq[(first_d[j], first_q[j])] = acc_w[j]
+
+    # Materialize nodes/edges. Node names are built once per node here, and each node type goes
+    # in with one add_nodes_from carrying its final attributes, in the order edge insertion
+    # would create them (a domain-query edge only joins a domain and a query that already have
+    # session edges), so the edge adds never re-add or merge a node. Each weight map is already
+    # aggregated by (u, v) and the three edge types never share an endpoint pair, so every edge
+    # type goes in as one bulk add.
+    # Interned, so ids coming from elsewhere (node_to_comm.json keys, UI picks) that are interned
+    # too match graph keys by identity.
+    s_names = [sys.intern(f"s:{s}") for s in sessions]
+    d_names = [sys.intern(f"d:{d}") for d in domains]
+    q_names = [sys.intern(f"q:{q}") for q in queries]
+
+    def _query_node(qi: int) -> Tuple[str, dict]:
+        ps = ps_arr[qi]
+        return q_names[qi], {
+            "ntype": "query",
+            "qclass": _qclass_from_psignal(ps),
+            "qquality": qqual_arr[qi],
+            "psignal": ps,
+        }
+
+    G.add_nodes_from(s_names, ntype="session")
+    G.add_nodes_from((d_names[di] for di in dict.fromkeys(sd_d)), ntype="domain")
+    G.add_nodes_from(_query_node(qi) for qi in dict.fromkeys(sq_q))
+    G.add_weighted_edges_from(
+        ((s_names[i], d_names[j], float(w)) for (i, j), w in w_sd.items()), etype="session-domain"
+    )
+    G.add_weighted_edges_from(
+        ((s_names[i], q_names[j], float(w)) for (i, j), w in w_sq.items()), etype="session-query"
+    )
+    G.add_weighted_edges_from(
+        ((d_names[i], q_names[j], float(w)) for (i, j), w in w_dq.items()), etype="domain-query"
+    )
 
     return G
 
@@ -9,17 +9,20 @@ Main entrypoints:
 - summarize_topic_communities(G, node_to_comm, top_k=8) -> summaries
 
 Notes:
-- Uses greedy modularity (NetworkX) for deterministic-ish clustering without extra deps.
+- Uses Leiden (igraph + leidenalg, seeded) when those are installed; otherwise falls back to
+  greedy modularity (NetworkX) so the pipeline still runs without extra deps.
 """
 
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import networkx as nx
+import numpy as np
 from networkx.algorithms.community import greedy_modularity_communities
+from scipy import sparse
 
-from src.graph.build_graph import MIN_QUERY_QUALITY
+from src.graph._query_scoring import MIN_QUERY_QUALITY
 
 
 def _node_type(G: nx.Graph, n: str) -> str:
@@ -35,8 +38,8 @@ def _node_type(G: nx.Graph, n: str) -> str:
     return "unknown"
 
 
-def build_domain_query_projection(G: nx.Graph) -> nx.Graph:
-    """Project the heterogeneous graph onto domain/query nodes only.
+def domain_query_adjacency(G: nx.Graph) -> Tuple[List[str], sparse.csr_matrix]:
+    """Weighted adjacency of the domain–query projection as (nodes, symmetric CSR).
 
     Why: session nodes act as high-degree bridges that can glue unrelated topics
     into mega-communities. We keep sessions for trails/explanations, but we cluster
@@ -45,14 +48,13 @@ def build_domain_query_projection(G: nx.Graph) -> nx.Graph:
     This function keeps only:
       - nodes where ntype is domain or query
       - edges where etype == 'domain-query' (if present) and always uses weights
+    Row/column i of the matrix is nodes[i]; nodes keep G's node order.
     """
-    H = nx.Graph()
-
-    # Keep only domain/query nodes
+    nodes: List[str] = []
     for n in G.nodes:
         t = _node_type(G, n)
         if t == "domain":
-            H.add_node(n, **G.nodes[n])
+            nodes.append(n)
             continue
         if t == "query":
             # Route utility + very low-quality queries away from topical communities
@@ -60,36 +62,53 @@ def build_domain_query_projection(G: nx.Graph) -> nx.Graph:
             qqual = float(G.nodes[n].get("qquality", 1.0))
             if qclass == "utility" or qqual < MIN_QUERY_QUALITY:
                 continue
-            H.add_node(n, **G.nodes[n])
+            nodes.append(n)
             continue
-
-    # Keep only domain-query edges (ignore any edges touching session nodes)
-    for u, v, data in G.edges(data=True):
-        if _node_type(G, u) == "session" or _node_type(G, v) == "session":
+    idx = {n: i for i, n in enumerate(nodes)}
+
+    # Keep only domain-query edges whose endpoints survived node filtering above
+    # (session endpoints are never in idx).
+    rows: List[int] = []
+    cols: List[int] = []
+    data: List[float] = []
+    for u, v, d in G.edges(data=True):
+        i = idx.get(u)
+        j = idx.get(v)
+        if i is None or j is None:
             continue
-
-        et = data.get("etype")
+        et = d.get("etype")
         if et is not None and et != "domain-query":
             continue
+        rows.append(i)
+        cols.append(j)
+        data.append(float(d.get("weight", 1.0)))
 
-        # IMPORTANT: only keep edges whose endpoints survived node filtering above.
-        # Otherwise NetworkX will auto-create missing nodes and defeat our filters.
-        if not H.has_node(u) or not H.has_node(v):
-            continue
+    A = sparse.coo_matrix((data, (rows, cols)), shape=(len(nodes), len(nodes))).tocsr()
+    return nodes, (A + A.T).tocsr()
 
-        w = float(data.get("weight", 1.0))
-        if H.has_edge(u, v):
-            H[u][v]["weight"] += w
-        else:
-            H.add_edge(u, v, weight=w)
 
+def _graph_from_adjacency(nodes: List[str], A: sparse.csr_matrix, G: Optional[nx.Graph] = None) -> nx.Graph:
+    """nx.Graph over `nodes` with A's weights (node attributes copied from G if given)."""
+    H = nx.Graph()
+    if G is not None:
+        H.add_nodes_from((n, G.nodes[n]) for n in nodes)
+    else:
+        H.add_nodes_from(nodes)
+    U = sparse.triu(A, format="coo")
+    H.add_weighted_edges_from((nodes[i], nodes[j], float(w)) for i, j, w in zip(U.row, U.col, U.data))
     return H
 
 
+def build_domain_query_projection(G: nx.Graph) -> nx.Graph:
+    """Project the heterogeneous graph onto domain/query nodes only (see domain_query_adjacency)."""
+    nodes, A = domain_query_adjacency(G)
+    return _graph_from_adjacency(nodes, A, G)
+
+
 def detect_topic_communities(G: nx.Graph, *, min_size: int = 8) -> Dict[str, int]:
     """Detect communities on the domain–query projection for cleaner topics."""
-    H = build_domain_query_projection(G)
-    return detect_communities(H, min_size=min_size)
+    nodes, A = domain_query_adjacency(G)
+    return _detect_on_adjacency(nodes, A, min_size=min_size)
 
 
 def summarize_topic_communities(G: nx.Graph, node_to_comm: Dict[str, int], top_k: int = 8) -> List[dict]:
@@ -98,17 +117,41 @@ def summarize_topic_communities(G: nx.Graph, node_to_comm: Dict[str, int], top_k
     return summarize_communities(H, node_to_comm, top_k=top_k)
 
 
-def detect_communities(G: nx.Graph, *, min_size: int = 8) -> Dict[str, int]:
-    """
-    Deterministic-ish community detection using greedy modularity (no extra deps).
-    Returns node -> community_id for communities >= min_size; others get -1.
-    """
-    # Work on largest connected component for stability
-    if G.number_of_nodes() == 0:
+def _leiden_communities(nodes: List[str], A: sparse.csr_matrix) -> Optional[List[set]]:
+    """Weighted Leiden modularity partition (C-backed). None if igraph/leidenalg are missing."""
+    try:
+        import igraph
+        import leidenalg
+    except ImportError:
+        return None
+
+    U = sparse.triu(A, format="coo")
+    g = igraph.Graph(
+        n=len(nodes),
+        edges=list(zip(U.row.tolist(), U.col.tolist())),
+        directed=False,
+        edge_attrs={"weight": U.data.tolist()},
+    )
+    partition = leidenalg.find_partition(g, leidenalg.ModularityVertexPartition, weights="weight", seed=0)
+
+    comms: List[set] = [set() for _ in range(len(partition))]
+    for i, c in enumerate(partition.membership):
+        comms[c].add(nodes[i])
+    return comms
+
+
+def _detect_on_adjacency(
+    nodes: List[str], A: sparse.csr_matrix, *, min_size: int, H: Optional[nx.Graph] = None
+) -> Dict[str, int]:
+    if not nodes:
         return {}
 
-    # greedy_modularity_communities supports 'weight'
-    comms = list(greedy_modularity_communities(G, weight="weight"))
+    comms = _leiden_communities(nodes, A)
+    if comms is None:
+        # greedy_modularity_communities supports 'weight'
+        if H is None:
+            H = _graph_from_adjacency(nodes, A)
+        comms = list(greedy_modularity_communities(H, weight="weight"))
     comms_sorted = sorted(comms, key=lambda c: len(c), reverse=True)
 
     node_to_comm: Dict[str, int] = {}
@@ -121,38 +164,69 @@ def detect_communities(G: nx.Graph, *, min_size: int = 8) -> Dict[str, int]:
         cid += 1
 
     # mark leftovers
-    for n in G.nodes():
+    for n in nodes:
         if n not in node_to_comm:
             node_to_comm[n] = -1
 
     return node_to_comm
 
 
+def detect_communities(G: nx.Graph, *, min_size: int = 8) -> Dict[str, int]:
+    """
+    Deterministic-ish community detection: seeded Leiden if available, else greedy modularity.
+    Returns node -> community_id for communities >= min_size; others get -1.
+    """
+    nodes = list(G.nodes)
+    if not nodes:
+        return {}
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight="weight", format="csr")
+    return _detect_on_adjacency(nodes, sparse.csr_matrix(A), min_size=min_size, H=G)
+
+
 def summarize_communities(G: nx.Graph, node_to_comm: Dict[str, int], top_k: int = 8) -> List[dict]:
     """
     For each community, show top domains/queries by weighted degree within the community.
     """
+    nodes = [n for n, cid in node_to_comm.items() if cid != -1 and n in G]
+    if nodes:
+        A = sparse.csr_matrix(nx.to_scipy_sparse_array(G, nodelist=nodes, weight="weight", format="csr"))
+    else:
+        # (to_scipy_sparse_array rejects an empty nodelist) members absent from G still get
+        # summaries, with zero weighted degree
+        A = sparse.csr_matrix((0, 0))
+    return _summarize_on_adjacency(G, nodes, A, node_to_comm, top_k=top_k)
+
+
+def _summarize_on_adjacency(
+    G: nx.Graph, nodes: List[str], A: sparse.csr_matrix, node_to_comm: Dict[str, int], *, top_k: int
+) -> List[dict]:
+    """summarize_communities over a precomputed adjacency (row i of A is nodes[i]); G supplies node attrs."""
+    idx = {n: i for i, n in enumerate(nodes)}
+
     # group nodes
     comm_to_nodes: Dict[int, List[str]] = {}
     for n, cid in node_to_comm.items():
         comm_to_nodes.setdefault(cid, []).append(n)
 
     summaries: List[dict] = []
-    for cid, nodes in sorted(comm_to_nodes.items(), key=lambda x: len(x[1]), reverse=True):
+    for cid, members in sorted(comm_to_nodes.items(), key=lambda x: len(x[1]), reverse=True):
         if cid == -1:
             continue
-        sub = G.subgraph(nodes).copy()
 
-        # weighted degree
-        deg = dict(sub.degree(weight="weight"))
+        # weighted degree inside the community: row sums of the community's block of A
+        present = [n for n in members if n in idx]
+        ii = np.fromiter((idx[n] for n in present), dtype=np.int64, count=len(present))
+        # longdouble: CSR adds edges in a different order than G.degree did; float64 rounding could flip ties
+        row_sums = A[ii][:, ii].sum(axis=1, dtype=np.longdouble)
+        deg = dict(zip(present, np.asarray(row_sums).ravel().astype(np.float64).tolist()))
 
-        domains = [n for n in nodes if n.startswith("d:")]
+        domains = [n for n in members if n.startswith("d:")]
         queries = [
             n
-            for n in nodes
+            for n in members
             if n.startswith("q:")
-            and sub.nodes[n].get("qclass") != "utility"
-            and float(sub.nodes[n].get("qquality", 1.0)) >= MIN_QUERY_QUALITY
+            and G.nodes[n].get("qclass") != "utility"
+            and float(G.nodes[n].get("qquality", 1.0)) >= MIN_QUERY_QUALITY
         ]
 
         domains_sorted = sorted(domains, key=lambda n: deg.get(n, 0.0), reverse=True)[:top_k]
@@ -161,7 +235,7 @@ def summarize_communities(G: nx.Graph, node_to_comm: Dict[str, int], top_k: int
         summaries.append(
             {
                 "community_id": cid,
-                "size": len(nodes),
+                "size": len(members),
                 "top_domains": [d[2:] for d in domains_sorted],
                 "top_queries": [q[2:] for q in queries_sorted],
             }
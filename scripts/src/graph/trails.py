@@ -6,6 +6,7 @@ What it does:
 
 Main entrypoint:
 - build_session_trails(events, max_events_per_session=8, query_meta=None) -> Dict[session_id, trail]
+  (`events` may be a list of Events or an EventTable)
 
 Notes:
 - No keyword-based utility detection. If `query_meta` is supplied, we split queries using
@@ -14,69 +15,104 @@ Notes:
 
 from __future__ import annotations
 
-from collections import Counter, defaultdict
-from typing import Dict, List, Optional
+import heapq
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-from src.ingest.parse_takeout import Event
+from src.ingest.parse_takeout import Event, EventTable
+
+
+def _most_common(counts: Dict[str, int], n: int) -> List[Tuple[str, int]]:
+    """`Counter.most_common(n)` over a plain dict (ties keep insertion order, as there)."""
+    if len(counts) <= 1:
+        return list(counts.items())
+    if len(counts) <= n:
+        return sorted(counts.items(), key=itemgetter(1), reverse=True)
+    # bounded n-element heap instead of sorting every distinct key
+    return heapq.nlargest(n, counts.items(), key=itemgetter(1))
 
 
 def build_session_trails(
-    events: List[Event],
+    events: Union[List[Event], EventTable],
     *,
     max_events_per_session: int = 8,
     query_meta: Optional[Dict[str, dict]] = None,
 ) -> Dict[str, dict]:
     """Build an explainable "micro-story" per session."""
 
-    by_session: Dict[str, List[Event]] = defaultdict(list)
-    for e in events:
-        sid = e.id.split(":", 1)[0]
-        by_session[sid].append(e)
+    # Column views of the events; each step below reads only the columns it needs.
+    table = events if isinstance(events, EventTable) else EventTable.from_events(events)
+    sids = table.session_ids
+    times = table.times
+    domains = table.domains
+    queries = table.queries
+    titles = table.titles
+
+    # Ordering invariant: load_events sorts globally by time and assign_sessions keeps that
+    # order, so the input is normally already time-sorted and the stable sort is only paid for
+    # out-of-order input; either way there is a single pass in time order below.
+    if any(b < a for a, b in zip(times, times[1:])):
+        order = sorted(range(len(table)), key=times.__getitem__)
+    else:
+        order = range(len(table))
+
+    # Resolve the utility/interest split once per distinct query instead of once per event.
+    is_util: Dict[str, bool] = {}
+    if query_meta:
+        for q in {q for q in queries if q}:
+            meta = query_meta.get(q)
+            is_util[q] = isinstance(meta, dict) and str(meta.get("qclass", "interest")) == "utility"
+
+    # Split the time-ordered positions per session (first-seen session order). Sessions from
+    # assign_sessions are contiguous runs in time order, so one groupby pass yields each
+    # session's positions whole; a session split across runs is concatenated.
+    # Runs are position slices of `order` (plain ranges for already-sorted input).
+    by_session: Dict[str, Sequence[int]] = dict.fromkeys(sids)
+    pos = 0
+    for sid, run in groupby(sids if isinstance(order, range) else [sids[i] for i in order]):
+        n = len(list(run))
+        prev = by_session[sid]
+        by_session[sid] = order[pos : pos + n] if prev is None else [*prev, *order[pos : pos + n]]
+        pos += n
 
     trails: Dict[str, dict] = {}
-    for sid, es in by_session.items():
-        es_sorted = sorted(es, key=lambda x: x.time)
-        t0 = es_sorted[0].time
-        t1 = es_sorted[-1].time
-
-        doms = [e.domain for e in es_sorted if e.domain]
-
-        qs_interest: List[str] = []
-        qs_utility: List[str] = []
-        for ev in es_sorted:
-            if not ev.query:
-                continue
-            if query_meta and isinstance(query_meta.get(ev.query), dict):
-                qc = str(query_meta[ev.query].get("qclass", "interest"))
-                (qs_utility if qc == "utility" else qs_interest).append(ev.query)
-            else:
-                qs_interest.append(ev.query)
-
-        top_domains = [d for d, _ in Counter(doms).most_common(5)]
-        top_queries = [q for q, _ in Counter(qs_interest).most_common(5)]
-        top_queries_utility = [q for q, _ in Counter(qs_utility).most_common(5)]
+    for sid, idx in by_session.items():
+        # One fused pass over the session's events feeds all three tallies.
+        doms: Dict[str, int] = {}
+        qs_interest: Dict[str, int] = {}
+        qs_utility: Dict[str, int] = {}
+        for i in idx:
+            d = domains[i]
+            if d:
+                doms[d] = doms.get(d, 0) + 1
+            q = queries[i]
+            if q:
+                ctr = qs_utility if is_util.get(q, False) else qs_interest
+                ctr[q] = ctr.get(q, 0) + 1
 
         # representative titles: first/last + a few middles
-        reps: List[str] = []
-        if es_sorted:
-            reps.append(es_sorted[0].title)
-            if len(es_sorted) > 1:
-                reps.append(es_sorted[-1].title)
-        for e in es_sorted[1:-1]:
+        reps: List[str] = [titles[idx[0]]]
+        if len(idx) > 1:
+            reps.append(titles[idx[-1]])
+        seen = set(reps)
+        for i in idx[1:-1]:
             if len(reps) >= max_events_per_session:
                 break
-            if e.title not in reps:
-                reps.append(e.title)
+            t = titles[i]
+            if t not in seen:
+                reps.append(t)
+                seen.add(t)
 
         trails[sid] = {
             "session_id": sid,
-            "start_time": t0.isoformat(),
-            "end_time": t1.isoformat(),
-            "n_events": len(es_sorted),
-            "top_domains": top_domains,
-            "top_queries": top_queries,
-            "top_queries_utility": top_queries_utility,
+            "start_time": times[idx[0]].isoformat(),
+            "end_time": times[idx[-1]].isoformat(),
+            "n_events": len(idx),
+            "top_domains": [d for d, _ in _most_common(doms, 5)],
+            "top_queries": [q for q, _ in _most_common(qs_interest, 5)],
+            "top_queries_utility": [q for q, _ in _most_common(qs_utility, 5)],
             "representative_titles": reps[:max_events_per_session],
         }
 
-    return trails
\ No newline at end of file
+    return trails
@@ -6,9 +6,11 @@ What this file does:
 
 Main entrypoint:
 - load_events(json_path) -> List[Event]
+- loads_json(raw) -> decoded JSON (orjson when installed, else the stdlib); shared with the Streamlit app
 
 Outputs:
 - Event dataclass objects (sorted by time, UTC)
+- EventTable.from_events(events) gives the same data as parallel per-field lists
 
 Notes:
 - We intentionally do NOT synthesize queries for visit/view events; doing so creates supernodes and
@@ -19,22 +21,53 @@ from __future__ import annotations
 
 import json
 import re
+import sys
 from dataclasses import dataclass, asdict
 from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import parse_qs, unquote, urlparse
 
 
-SEARCH_RE = re.compile(r"^Searched for (.+)$", re.IGNORECASE)
-VISIT_RE = re.compile(r"^Visited (.+)$", re.IGNORECASE)
-VIEW_RE = re.compile(r"^Viewed (.+)$", re.IGNORECASE)
+# "Searched for ..." / "Visited ..." / "Viewed ..." titles in one anchored alternation (the
+# prefixes are disjoint, so at most one branch can match); `lastindex` tells which one did.
+_CLASSIFY_RE = re.compile(r"^(?:Searched for (.+)|Visited (.+)|Viewed (.+))$", re.IGNORECASE)
+_CLASSIFY_TYPES = (None, "search", "visit", "view")
+
+_WS_RE = re.compile(r"\s+")
+_TRAIL_PUNCT_RE = re.compile(r"[\.,!?;:]+$")
+# google.<ccTLD>, google.co.<ccTLD>, google.com.<ccTLD>
+_GOOGLE_CCTLD_RE = re.compile(r"^google\.(?:[a-z]{2,3}|co\.[a-z]{2}|com\.[a-z]{2})$")
+
+# Domain families whose subdomains (mobile/language variants) collapse onto the base domain,
+# e.g. m.youtube.com -> youtube.com, en.m.wikipedia.org -> wikipedia.org.
+_FAMILY_DOMAINS = {
+    "youtube.com": ".youtube.com",
+    "wikipedia.org": ".wikipedia.org",
+}
+
+# Literal prefix of the dominant redirect shape; these URLs skip urlparse/parse_qs.
+_GOOGLE_REDIRECT_PREFIXES = ("https://www.google.com/url?", "http://www.google.com/url?")
+
+# Below this many rows, process start-up and pickling Events back outweigh parallel row work.
+_PARALLEL_MIN_ROWS = 50_000
+
+_QUOTE_TRANS = str.maketrans({"\u2019": "'", "\u2018": "'", "\u201c": '"', "\u201d": '"'})
 
 EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)  # no per-event __dict__; needs Python 3.10+
 class Event:
+    """One history row.
+
+    Mutable and therefore unhashable (it used to be a frozen dataclass): assign_sessions
+    rewrites `id` and sets `session_id` in place. Key sets/dicts by `e.id`, not by the Event.
+    `to_dict()` includes `session_id` ("" before sessionizing).
+    """
+
     id: str
     time: datetime
     title: str
@@ -44,6 +77,7 @@ class Event:
     url: Optional[str]
     domain: str
     subtitles: List[str]
+    session_id: str = ""  # set by assign_sessions
 
     def to_dict(self) -> Dict[str, Any]:
         d = asdict(self)
@@ -51,6 +85,36 @@ class Event:
         return d
 
 
+@dataclass(slots=True)
+class EventTable:
+    """Column (struct-of-arrays) view of a list of Events: one parallel list per field.
+
+    Aggregation passes index these lists by event position instead of touching each Event.
+    """
+
+    ids: List[str]
+    session_ids: List[str]
+    times: List[datetime]
+    titles: List[str]
+    domains: List[str]
+    queries: List[str]
+
+    @classmethod
+    def from_events(cls, events: Sequence[Event]) -> "EventTable":
+        return cls(
+            ids=[e.id for e in events],
+            # events that never went through assign_sessions keep the "sXXXX:" id convention
+            session_ids=[e.session_id or e.id.split(":", 1)[0] for e in events],
+            times=[e.time for e in events],
+            titles=[e.title for e in events],
+            domains=[e.domain for e in events],
+            queries=[e.query for e in events],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
 def _parse_time(s: Any) -> datetime:
     """
     Takeout often uses ISO strings like '2024-01-05T08:29:34.280Z'.
@@ -59,6 +123,14 @@ def _parse_time(s: Any) -> datetime:
         # fallback: epoch start UTC
         return EPOCH_UTC
 
+    if s[-1] == "Z":
+        # Fast path for the usual '...Z' shape: Python 3.11+ reads the suffix as UTC directly,
+        # skipping the string rewrite and astimezone. Older versions raise and fall through.
+        try:
+            return datetime.fromisoformat(s)
+        except ValueError:
+            pass
+
     # normalize 'Z'
     s2 = s.replace("Z", "+00:00")
     try:
@@ -70,11 +142,40 @@ def _parse_time(s: Any) -> datetime:
         return EPOCH_UTC
 
 
+def _redirect_target(query: str) -> Optional[str]:
+    """First non-blank `q` (else `url`) value of a redirect query string, or None.
+
+    Same result as `unquote(parse_qs(query)[key][0])` without building the dict of lists.
+    """
+    fields = query.split("&")
+    for key in ("q", "url"):
+        for field in fields:
+            name, sep, value = field.partition("=")
+            if not sep or not value:
+                continue
+            if unquote(name.replace("+", " ")) == key:
+                return unquote(unquote(value.replace("+", " ")))
+    return None
+
+
 def _clean_google_redirect(maybe_url: Any) -> Optional[str]:
     if not isinstance(maybe_url, str) or not maybe_url:
         return None
+    return _clean_redirect_url(maybe_url)
+
 
+# Histories revisit the same URLs and hosts many times; the URL/host helpers below are pure
+# str -> str, so they are memoized (bounded, so memory stays flat on very large takeouts).
+@lru_cache(maxsize=100_000)
+def _clean_redirect_url(maybe_url: str) -> str:
     url = maybe_url.strip()
+
+    # Fast path: https://www.google.com/url?q=<dest>. urlsplit drops tab/CR/LF anywhere in the
+    # URL, so those rare inputs take the general path below.
+    if url.startswith(_GOOGLE_REDIRECT_PREFIXES) and not ("\t" in url or "\r" in url or "\n" in url):
+        query = url.split("?", 1)[1].split("#", 1)[0]
+        return _redirect_target(query) or url
+
     try:
         u = urlparse(url)
         host = (u.netloc or "").lower()
@@ -94,6 +195,7 @@ def _clean_google_redirect(maybe_url: Any) -> Optional[str]:
         return url
 
 
+@lru_cache(maxsize=100_000)
 def _normalize_domain(host: str) -> str:
     """Normalize domains to reduce fragmentation (www/mobile/language/country variants).
 
@@ -119,24 +221,17 @@ def _normalize_domain(host: str) -> str:
 
     # google.<ccTLD>, google.co.<ccTLD>, google.com.<ccTLD> -> google.com
     # Examples: google.de, google.co.uk, google.com.au
-    if re.match(r"^google\.(?:[a-z]{2,3}|co\.[a-z]{2}|com\.[a-z]{2})$", h):
+    if h.startswith("google.") and _GOOGLE_CCTLD_RE.match(h):
         return "google.com"
 
     # -----------------------------
-    # YouTube: collapse mobile/other subdomains
-    # Examples: m.youtube.com -> youtube.com
-    # -----------------------------
-    if h == "youtu.be":
-        return "youtu.be"
-    if h == "youtube.com" or h.endswith(".youtube.com"):
-        return "youtube.com"
-
-    # -----------------------------
-    # Wikipedia: collapse language/mobile subdomains
-    # Examples: en.m.wikipedia.org, en.wikipedia.org -> wikipedia.org
+    # YouTube (mobile/other subdomains) and Wikipedia (language/mobile subdomains):
+    # Examples: m.youtube.com -> youtube.com, en.m.wikipedia.org -> wikipedia.org
+    # (youtu.be short links are left as-is.)
     # -----------------------------
-    if h == "wikipedia.org" or h.endswith(".wikipedia.org"):
-        return "wikipedia.org"
+    for base, dot_base in _FAMILY_DOMAINS.items():
+        if h == base or h.endswith(dot_base):
+            return base
 
     return h
 
@@ -144,6 +239,11 @@ def _normalize_domain(host: str) -> str:
 def _extract_domain(url: Optional[str]) -> str:
     if not url:
         return ""
+    return _normalize_domain_from_url(url)
+
+
+@lru_cache(maxsize=100_000)
+def _normalize_domain_from_url(url: str) -> str:
     try:
         host = (urlparse(url).netloc or "")
         return _normalize_domain(host)
@@ -151,32 +251,19 @@ def _extract_domain(url: Optional[str]) -> str:
         return ""
 
 
-def _infer_event_type(title: str) -> str:
-    t = (title or "").strip()
-    if SEARCH_RE.match(t):
-        return "search"
-    if VISIT_RE.match(t):
-        return "visit"
-    if VIEW_RE.match(t):
-        return "view"
-    return "other"
-
+def _classify(title: str) -> Tuple[str, str]:
+    """(event_type, raw search query) from one regex scan of the title.
 
-def _extract_query(title: str) -> str:
-    """Extract a *search query* only for true search events.
-
-    Important: we intentionally do NOT synthesize queries for visited/viewed events.
-    Domains belong in `Event.domain`; turning visits into `q:<domain>` creates
-    supernodes (e.g., `q:google.com`) that collapse communities.
+    event_type is "search", "visit", "view" or "other". The query is extracted only for true
+    search events: we intentionally do NOT synthesize queries for visited/viewed events.
+    Domains belong in `Event.domain`; turning visits into `q:<domain>` creates supernodes
+    (e.g., `q:google.com`) that collapse communities.
     """
-    t = (title or "").strip()
-
-    m = SEARCH_RE.match(t)
-    if m:
-        return m.group(1).strip()
-
-    # For visited/viewed/other events, leave query empty.
-    return ""
+    m = _CLASSIFY_RE.match((title or "").strip())
+    if m is None:
+        return "other", ""
+    event_type = _CLASSIFY_TYPES[m.lastindex]
+    return event_type, (m.group(1).strip() if event_type == "search" else "")
 
 
 def _normalize_query(q: str) -> str:
@@ -184,68 +271,52 @@ def _normalize_query(q: str) -> str:
     q = (q or "").strip().lower()
 
     # normalize common unicode quotes/apostrophes
-    q = q.replace("\u2019", "'").replace("\u2018", "'")
-    q = q.replace("\u201c", '"').replace("\u201d", '"')
+    q = q.translate(_QUOTE_TRANS)
 
     # collapse whitespace
-    q = re.sub(r"\s+", " ", q)
+    q = _WS_RE.sub(" ", q)
 
     # strip surrounding quotes
     q = q.strip("\"'“”‘’")
 
     # drop trailing punctuation that often creates duplicate keys (.,!?;:)
-    q = re.sub(r"[\.,!?;:]+$", "", q).strip()
+    q = _TRAIL_PUNCT_RE.sub("", q).strip()
 
     return q
 
 
-def load_events(json_path: str) -> List[Event]:
-    """
-    Load and noralize browsing/search events from an exported takeout JSON file.
-
-    Parameters:
-    - json_path: Path to the JSON file containing the browsing/search events.
-    Returns:
-    - List[Event]: List of Event dataclass objects, sorted by time (UTC).
-    
-    Behavior:
-    - Parses event time into a timezone aware UTC datetime (invalid times fall back to EPOCH_UTC 
-    to keep ingestion consistent).
-    - Cleans up Google redirect URLs to extract the original destination URL.
-    - Extracts domains from the cleaned URL and normalizes common families (Google/Youtube/Wikipedia) 
-    to reduce fragmentation.
-    - Classifies events as search/visit/view/other based on the title text.
-
-    Notes:
-    We intentionally do not synthesize queries for visit/view events; 
-    doing so creates supernodes (large high degree nodes) like `q:google.com` that
-    collapse communities and make the graph less meaningful.
-    """
-
-    p = Path(json_path)
-    if not p.exists():
-        raise FileNotFoundError(f"search_history.json not found: {p}")
-
+def loads_json(raw: bytes) -> Any:
+    """Decode JSON bytes with orjson when it is installed (C parser, no intermediate str),
+    else the stdlib. Documents orjson rejects (NaN literals, >64-bit ints) fall back to json."""
     try:
-        data = json.loads(p.read_text(encoding="utf-8"))
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON in {p}: {e}") from e
+        import orjson
+    except ImportError:
+        return json.loads(raw)
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
 
-    if not isinstance(data, list):
-        raise ValueError(f"Expected list of events in {p}, got {type(data).__name__}")
 
+def _events_from_rows(start: int, rows: List[Any]) -> List[Event]:
+    """Build Events for `rows`, where rows[0] is row number `start` of the export.
+
+    Pure per row, so load_events can hand contiguous chunks to worker processes.
+    """
     out: List[Event] = []
-    for i, row in enumerate(data):
+    for i, row in enumerate(rows, start):
         if not isinstance(row, dict):
             continue
 
         time = _parse_time(row.get("time"))
-        title = str(row.get("title") or "")
+        # Titles, domains and queries repeat heavily across events; interning shares one object
+        # per distinct value, so downstream dict keys and `in` checks hit the identity fast path.
+        title = sys.intern(str(row.get("title") or ""))
         title_url = row.get("titleUrl")
 
         url = _clean_google_redirect(title_url)
-        domain = _extract_domain(url)
-        event_type = _infer_event_type(title)
+        domain = sys.intern(_extract_domain(url))
+        event_type, raw_query = _classify(title)
 
         subtitles_raw = row.get("subtitles") or []
         subtitles: List[str] = []
@@ -256,7 +327,8 @@ def load_events(json_path: str) -> List[Event]:
                 elif isinstance(s, str):
                     subtitles.append(s)
 
-        query = _normalize_query(_extract_query(title))
+        # only search titles carry a query; visit/view/other rows skip the normalization pipeline
+        query = sys.intern(_normalize_query(raw_query)) if raw_query else ""
 
         out.append(
             Event(
@@ -271,7 +343,59 @@ def load_events(json_path: str) -> List[Event]:
                 subtitles=subtitles,
             )
         )
+    return out
+
+
+def load_events(json_path: str, *, workers: int = 1) -> List[Event]:
+    """
+    Load and noralize browsing/search events from an exported takeout JSON file.
+
+    Parameters:
+    - json_path: Path to the JSON file containing the browsing/search events.
+    - workers: Worker processes for row processing. Only used above _PARALLEL_MIN_ROWS rows;
+    below that (or with workers <= 1) rows are processed in this process.
+    Returns:
+    - List[Event]: List of Event dataclass objects, sorted by time (UTC).
+    
+    Behavior:
+    - Parses event time into a timezone aware UTC datetime (invalid times fall back to EPOCH_UTC 
+    to keep ingestion consistent).
+    - Cleans up Google redirect URLs to extract the original destination URL.
+    - Extracts domains from the cleaned URL and normalizes common families (Google/Youtube/Wikipedia) 
+    to reduce fragmentation.
+    - Classifies events as search/visit/view/other based on the title text.
+
+    Notes:
+    We intentionally do not synthesize queries for visit/view events; 
+    doing so creates supernodes (large high degree nodes) like `q:google.com` that
+    collapse communities and make the graph less meaningful.
+    """
+
+    p = Path(json_path)
+    if not p.exists():
+        raise FileNotFoundError(f"search_history.json not found: {p}")
+
+    try:
+        data = loads_json(p.read_bytes())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in {p}: {e}") from e
+
+    if not isinstance(data, list):
+        raise ValueError(f"Expected list of events in {p}, got {type(data).__name__}")
 
-    # sort by time
-    out.sort(key=lambda e: e.time)
+    if workers > 1 and len(data) >= _PARALLEL_MIN_ROWS:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Contiguous chunks keep the row numbers (fallback ids) and the relative order. Strings
+        # are only interned per worker, so equal values from different chunks stay separate.
+        step = -(-len(data) // workers)
+        starts = range(0, len(data), step)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            chunks = ex.map(_events_from_rows, starts, [data[k : k + step] for k in starts])
+            out = [e for chunk in chunks for e in chunk]
+    else:
+        out = _events_from_rows(0, data)
+
+    # sort by time (exports are usually already ordered, which the stable sort detects as runs)
+    out.sort(key=attrgetter("time"))
     return out
@@ -2,32 +2,43 @@
 
 What it does:
 - Assigns session IDs to events based on time gaps (default: 30 minutes).
-- Rewrites Event.id to include the session prefix (e.g., s0003:<original_id>) so later joins are easy.
+- Rewrites Event.id to include the session prefix (e.g., s0003:<original_id>) so later joins are easy,
+  and records the session on Event.session_id.
 
 Main entrypoint:
-- assign_sessions(events, gap_minutes=30) -> (new_events, session_to_event_ids)
+- assign_sessions(events, gap_minutes=30) -> (events, session_ranges)
 
 Notes:
 - This is deterministic given the event ordering.
+- assign_sessions MUTATES the given Events (no per-event copy): pass copies if the caller still
+  needs the original ids. Calling it again on the same Events re-sessionizes them (the previous
+  "sXXXX:" prefix is replaced, not stacked).
 """
 
 from __future__ import annotations
 
-from dataclasses import replace
 from datetime import timedelta
-from typing import Dict, List, Tuple
+from typing import List, Tuple
 
 from .parse_takeout import Event
 
+# (session_id, start, end): the session's events are events[start:end]
+SessionRange = Tuple[str, int, int]
 
-def assign_sessions(events: List[Event], *, gap_minutes: int = 30) -> Tuple[List[Event], Dict[str, List[str]]]:
+
+def assign_sessions(events: List[Event], *, gap_minutes: int = 30) -> Tuple[List[Event], List[SessionRange]]:
     """
-    Assign session_id by time gap. Returns:
-      - new_events: list of Events with id rewritten to include session (stable unique)
-      - session_to_event_ids: mapping session_id -> event ids
+    Assign session_id by time gap, IN PLACE: each Event's `id` gets the "sXXXX:" session prefix
+    and its `session_id` is set. Returns:
+      - events: a new list of the same (now updated) Event objects; ids are stable and unique
+      - session_ranges: (session_id, start, end) per session, in order; events[start:end]
+        are that session's events
+
+    Events that already carry a session_id (a previous call) have that prefix replaced rather
+    than stacked, so re-running with another gap yields the same ids as a fresh run.
     """
     if not events:
-        return [], {}
+        return [], []
 
     gap = timedelta(minutes=gap_minutes)
 
@@ -36,22 +47,29 @@ def assign_sessions(events: List[Event], *, gap_minutes: int = 30) -> Tuple[List
 
     session_idx = 0
     session_id = _sid(session_idx)
-    session_to_event_ids: Dict[str, List[str]] = {session_id: []}
+    id_prefix = session_id + ":"
+    session_start = 0
+    session_ranges: List[SessionRange] = []
 
-    new_events: List[Event] = []
+    # One fused pass: the boundary test rides along with the id rewrite. (A vectorized
+    # np.diff over the tz-aware datetimes needs an object array and measured slower.)
     prev_time = events[0].time
-
-    for e in events:
-        if (e.time - prev_time) > gap:
+    for i, e in enumerate(events):
+        t = e.time
+        if (t - prev_time) > gap:
+            session_ranges.append((session_id, session_start, i))
             session_idx += 1
             session_id = _sid(session_idx)
-            session_to_event_ids[session_id] = []
+            id_prefix = session_id + ":"
+            session_start = i
+        prev_time = t
 
-        prev_time = e.time
+        # make event.id unique + session-aware (helps later joins); the "sXXXX:" prefix is built
+        # once per session, leaving a plain concatenation per event
+        old_sid = e.session_id
+        e.id = id_prefix + (e.id[len(old_sid) + 1 :] if old_sid else e.id)
+        e.session_id = session_id
 
-        # make event.id unique + session-aware (helps later joins)
-        new_id = f"{session_id}:{e.id}"
-        new_events.append(replace(e, id=new_id))
-        session_to_event_ids[session_id].append(new_id)
+    session_ranges.append((session_id, session_start, len(events)))
+    return list(events), session_ranges
 
-    return new_events, session_to_event_ids
\ No newline at end of file
@@ -2,17 +2,20 @@ from __future__ import annotations
 
 import json
 import os
+from bisect import bisect_right
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 
 import pandas as pd
 import streamlit as st
 import networkx as nx
-from pyvis.network import Network
+import numpy as np
+from scipy import sparse
 import streamlit.components.v1 as components
 
 # Import your existing pipeline
-from src.ingest.parse_takeout import load_events
+from src.ingest.parse_takeout import load_events, loads_json
 from src.ingest.sessionize import assign_sessions
 from src.graph.build_graph import build_history_graph, basic_graph_stats
 
@@ -22,7 +25,8 @@ from src.graph.build_graph import build_history_graph, basic_graph_stats
 # -----------------------------
 
 def load_json(path: Path):
-    return json.loads(path.read_text(encoding="utf-8"))
+    # the Takeout loader's decoder: orjson when installed (matters for a large node_to_comm.json)
+    return loads_json(path.read_bytes())
 
 def strip_prefix(n: str) -> str:
     return n.split(":", 1)[1] if ":" in n else n
@@ -31,146 +35,316 @@ def node_type(G: nx.Graph, n: str) -> str:
     return G.nodes[n].get("ntype", "unknown")
 
 def safe_float(x, default=0.0) -> float:
+    # (per-element loops inline `float(x) if isinstance(x, (int, float))` and only fall back
+    # here for other values, keeping try/except off the common numeric path)
     try:
         return float(x)
     except Exception:
         return float(default)
 
-def sort_edges_by_weight(G: nx.Graph) -> List[Tuple[str, str, float]]:
-    out = []
-    for u, v, d in G.edges(data=True):
-        out.append((u, v, safe_float(d.get("weight", 1.0), 1.0)))
-    out.sort(key=lambda t: t[2], reverse=True)
-    return out
-
-def filter_to_top_edges(G: nx.Graph, max_edges: int = 2500) -> nx.Graph:
-    """Return a subgraph containing only the strongest edges (keeps all incident nodes)."""
-    if G.number_of_edges() <= max_edges:
-        return G
-    edges = sort_edges_by_weight(G)[:max_edges]
+def _top_k_indices(w: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, largest first; ties keep index order (a stable sort's prefix)."""
+    k = max(0, min(int(k), len(w)))
+    if k == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < len(w):
+        # O(E) selection of the k-th largest weight, then only the k winners get sorted
+        kth = np.partition(w, len(w) - k)[len(w) - k]
+        above = np.flatnonzero(w > kth)
+        ties = np.flatnonzero(w == kth)[: k - len(above)]
+        sel = np.concatenate([above, ties])
+    else:
+        sel = np.arange(len(w))
+    return sel[np.lexsort((sel, -w[sel]))]
+
+def _graph_from_edges(G: nx.Graph, edges) -> nx.Graph:
+    """New graph of the given (u, v, weight) edges of G, with G's node and edge attributes."""
     H = nx.Graph()
     for u, v, w in edges:
         H.add_node(u, **G.nodes[u])
         H.add_node(v, **G.nodes[v])
         attrs = dict(G.get_edge_data(u, v) or {})
         # Avoid passing weight twice (some graphs already store it in attrs)
-        attrs["weight"] = float(w)
+        attrs["weight"] = w
         H.add_edge(u, v, **attrs)
-    # drop isolates
-    isolates = [n for n in H.nodes if H.degree(n) == 0]
-    H.remove_nodes_from(isolates)
+    # H only gains nodes as edge endpoints, so it has no isolates to drop
     return H
 
+# vis-network page that PyVis used to generate: same library build, colors and options, with
+# nodes/edges serialized once as JSON instead of going through PyVis' per-call dicts and template.
+_VIS_CDN = "https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist"
+_VIS_CSS_SRI = "sha512-WgxfT5LWjfszlPHXRmBWHkV2eceiWTOBvrKCNbdgDYTHrT2AeLCGbF4sZlZw3UMN3WtL0tGUoIAKsu8mllg/XA=="
+_VIS_JS_SRI = "sha512-LnvoEWDFrqGHlHmDD2101OrLcbsfkrzoSpvtSQtxK3RMnRV0eOkhhBN2dXHKRrUU8p2DGRTk35n4O8nWSVe1mQ=="
+_VIS_BG_COLOR = "#0b0b0b"
+_VIS_FONT_COLOR = "#f3f3f3"
+_VIS_NODE_COLOR = "#97c2fc"  # PyVis' default node color
+_VIS_SHAPES = {"query": "box", "session": "triangle"}  # everything else is a "dot"
+# better UX
+_VIS_OPTIONS = {
+    "physics": {
+        "enabled": True,
+        "forceAtlas2Based": {
+            "gravitationalConstant": -50,
+            "centralGravity": 0.01,
+            "springLength": 120,
+            "springConstant": 0.02,
+        },
+        "solver": "forceAtlas2Based",
+        "stabilization": {"enabled": True, "iterations": 600},
+    },
+    "interaction": {
+        "hover": True,
+        "tooltipDelay": 120,
+        "navigationButtons": True,
+        "keyboard": True,
+    },
+}
+
+def _script_json(obj) -> str:
+    """JSON that is safe inside an inline <script> (labels are user text, e.g. "</script>")."""
+    return json.dumps(obj).replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
 def pyvis_html(
     G: nx.Graph,
     height_px: int = 820,
     max_nodes: int = 500,
+    deg: Optional[Dict[str, float]] = None,
 ) -> str:
-    """Render an interactive graph with PyVis and return HTML."""
+    """Render an interactive graph as a vis-network page (PyVis' layout, built directly) and return HTML.
+
+    `deg` may pass in G's weighted degrees when the caller already has them.
+    """
     # If too many nodes, keep highest weighted-degree nodes.
     H = G
     if H.number_of_nodes() > max_nodes:
-        deg = dict(H.degree(weight="weight"))
-        keep = sorted(H.nodes, key=lambda n: deg.get(n, 0.0), reverse=True)[:max_nodes]
+        if deg is None:
+            deg = dict(H.degree(weight="weight"))
+        nodes = list(H.nodes)
+        deg_arr = np.fromiter((deg.get(n, 0.0) for n in nodes), dtype=np.float64, count=len(nodes))
+        keep = [nodes[i] for i in _top_k_indices(deg_arr, max_nodes)]
         H = H.subgraph(keep).copy()
 
-    net = Network(height=f"{height_px}px", width="100%", bgcolor="#0b0b0b", font_color="#f3f3f3")
-    net.force_atlas_2based(gravity=-30, central_gravity=0.01, spring_length=120, spring_strength=0.02)
-
-    for n, data in H.nodes(data=True):
-        t = data.get("ntype", "unknown")
-        label = strip_prefix(n)
-
-        # Keep labels short
-        if len(label) > 42:
-            label = label[:41] + "…"
-
-        title_lines = [
-            f"<b>{n}</b>",
-            f"ntype: {t}",
-        ]
-        if t == "query":
-            title_lines.append(f"qclass: {data.get('qclass', '')}")
-            title_lines.append(f"qquality: {safe_float(data.get('qquality', 1.0), 1.0):.2f}")
-
-        # Shape helps readability without relying on color
-        shape = "dot"
-        if t == "query":
-            shape = "box"
-        elif t == "session":
-            shape = "triangle"
-        elif t == "domain":
-            shape = "dot"
-
-        net.add_node(
-            n,
-            label=label,
-            title="<br/>".join(title_lines),
-            shape=shape,
-        )
-
+    # Node/edge records are built column-wise in single comprehensions (no per-node branching);
+    # the font dict is shared, it serializes the same for every node.
+    node_items = list(H.nodes(data=True))
+    ntypes = [data.get("ntype", "unknown") for _, data in node_items]
+    labels = [strip_prefix(n) for n, _ in node_items]
+    # Keep labels short
+    labels = [lab if len(lab) <= 42 else lab[:41] + "…" for lab in labels]
+    titles = [
+        f"<b>{n}</b><br/>ntype: {t}<br/>qclass: {data.get('qclass', '')}<br/>"
+        f"qquality: {safe_float(data.get('qquality', 1.0), 1.0):.2f}"
+        if t == "query"
+        else f"<b>{n}</b><br/>ntype: {t}"
+        for (n, data), t in zip(node_items, ntypes)
+    ]
+    # Shape helps readability without relying on color
+    shapes = [_VIS_SHAPES.get(t, "dot") for t in ntypes]
+    font = {"color": _VIS_FONT_COLOR}
+    nodes = [
+        {"id": n, "label": lab, "title": title, "shape": shape, "color": _VIS_NODE_COLOR, "font": font}
+        for (n, _), lab, title, shape in zip(node_items, labels, titles, shapes)
+    ]
+
+    edges = []
     for u, v, d in H.edges(data=True):
-        w = safe_float(d.get("weight", 1.0), 1.0)
+        w = d.get("weight", 1.0)
+        w = float(w) if isinstance(w, (int, float)) else safe_float(w, 1.0)
         et = d.get("etype", "")
-        net.add_edge(u, v, value=w, title=f"weight={w:.2f}<br/>etype={et}")
-
-    # better UX
-    net.set_options(
-        """
-        var options = {
-          "physics": {
-            "enabled": true,
-            "forceAtlas2Based": {
-              "gravitationalConstant": -50,
-              "centralGravity": 0.01,
-              "springLength": 120,
-              "springConstant": 0.02
-            },
-            "solver": "forceAtlas2Based",
-            "stabilization": { "enabled": true, "iterations": 600 }
-          },
-          "interaction": {
-            "hover": true,
-            "tooltipDelay": 120,
-            "navigationButtons": true,
-            "keyboard": true
-          }
-        }
-        """
+        edges.append({"from": u, "to": v, "value": w, "title": f"weight={w:.2f}<br/>etype={et}"})
+
+    return f"""<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="{_VIS_CDN}/dist/vis-network.min.css" integrity="{_VIS_CSS_SRI}" crossorigin="anonymous" referrerpolicy="no-referrer" />
+<script src="{_VIS_CDN}/vis-network.min.js" integrity="{_VIS_JS_SRI}" crossorigin="anonymous" referrerpolicy="no-referrer"></script>
+<style type="text/css">
+#mynetwork {{ width: 100%; height: {int(height_px)}px; background-color: {_VIS_BG_COLOR}; border: 1px solid lightgray; position: relative; float: left; }}
+</style>
+</head>
+<body>
+<div id="mynetwork"></div>
+<script type="text/javascript">
+var nodes = new vis.DataSet({_script_json(nodes)});
+var edges = new vis.DataSet({_script_json(edges)});
+var network = new vis.Network(document.getElementById("mynetwork"), {{nodes: nodes, edges: edges}}, {_script_json(_VIS_OPTIONS)});
+</script>
+</body>
+</html>
+"""
+
+
+@dataclass
+class GraphSoA:
+    """Column arrays over G's nodes (G's node order), so whole-graph scans are array slices.
+
+    Categorical attributes are stored as int8 codes into the matching *_names tuple; a missing
+    attribute gets the same default the dict lookups used ("unknown" ntype, "" qclass, 1.0 qquality).
+    """
+
+    ids: np.ndarray  # object array of node ids
+    row: Dict[str, int]  # node id -> position in the arrays / adjacency row
+    ntype_code: np.ndarray
+    ntype_names: Tuple[str, ...]
+    qclass_code: np.ndarray
+    qclass_names: Tuple[str, ...]
+    qquality: np.ndarray
+    adj: sparse.csr_array  # weighted adjacency, rows/cols in `ids` order
+    degree_w: np.ndarray  # weighted degree
+    # Explorer search index: domain/query node ids (graph order) and their lowercased labels
+    # joined by NUL, with each label's start offset (plus a final sentinel) for bisect.
+    dq_nodes: List[str]
+    dq_text: str
+    dq_starts: List[int]
+    # igraph copy of the topology (vertex ids = rows) for C-side traversals; None without igraph
+    ig: Optional["igraph.Graph"] = None
+
+    def type_mask(self, ntype: str) -> np.ndarray:
+        if ntype not in self.ntype_names:
+            return np.zeros(len(self.ids), dtype=bool)
+        return self.ntype_code == self.ntype_names.index(ntype)
+
+    def search_dq(self, qlow: str, limit: int = 80) -> List[str]:
+        """First `limit` domain/query nodes (graph order) whose lowercased label contains `qlow`."""
+        out: List[str] = []
+        if not qlow or "\0" in qlow:
+            return out
+        pos = 0
+        while len(out) < limit:
+            # str.find scans all labels in C; a hit maps back to its label by bisect, and the
+            # next search resumes at the following label so each node is reported once.
+            p = self.dq_text.find(qlow, pos)
+            if p < 0:
+                break
+            j = bisect_right(self.dq_starts, p) - 1
+            out.append(self.dq_nodes[j])
+            pos = self.dq_starts[j + 1]
+        return out
+
+
+def build_graph_soa(G: nx.Graph) -> GraphSoA:
+    n = G.number_of_nodes()
+    ids = np.empty(n, dtype=object)
+    ntype_code = np.empty(n, dtype=np.int8)
+    qclass_code = np.empty(n, dtype=np.int8)
+    qquality = np.empty(n, dtype=np.float64)
+    degree_w = np.empty(n, dtype=np.float64)
+    ntypes: Dict[str, int] = {}
+    qclasses: Dict[str, int] = {}
+    index = {node: i for i, node in enumerate(G)}
+    dq_nodes: List[str] = []
+    indptr = [0]
+    indices: List[int] = []
+    weights: List[float] = []
+    # one pass over the node attribute dicts and adjacency rows
+    for i, (node, data) in enumerate(G.nodes(data=True)):
+        ids[i] = node
+        ntype_code[i] = ntypes.setdefault(data.get("ntype", "unknown"), len(ntypes))
+        qclass_code[i] = qclasses.setdefault(data.get("qclass", ""), len(qclasses))
+        q = data.get("qquality", 1.0)
+        qquality[i] = q if isinstance(q, (int, float)) else safe_float(q, 1.0)
+        nbrs = G.adj[node]
+        row = [d.get("weight", 1) for d in nbrs.values()]
+        degree_w[i] = sum(row)  # G.degree(weight="weight") for a graph without self-loops
+        weights.extend(row)
+        indices.extend(map(index.__getitem__, nbrs))
+        indptr.append(len(indices))
+        if isinstance(node, str) and (node.startswith("d:") or node.startswith("q:")):
+            dq_nodes.append(node)
+    dq_labels = [strip_prefix(node).lower() for node in dq_nodes]
+    dq_starts = [0]
+    for label in dq_labels:
+        dq_starts.append(dq_starts[-1] + len(label) + 1)
+    adj = sparse.csr_array(
+        (np.asarray(weights, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(n, n),
     )
+    return GraphSoA(
+        ids=ids,
+        row=index,
+        ntype_code=ntype_code,
+        ntype_names=tuple(ntypes),
+        qclass_code=qclass_code,
+        qclass_names=tuple(qclasses),
+        qquality=qquality,
+        adj=adj,
+        degree_w=degree_w,
+        dq_nodes=dq_nodes,
+        dq_text="\0".join(dq_labels),
+        dq_starts=dq_starts,
+        ig=_igraph_from_adj(adj),
+    )
+
 
-    return net.generate_html()
+def _igraph_from_adj(adj: sparse.csr_array) -> Optional["igraph.Graph"]:
+    try:
+        import igraph
+    except ImportError:
+        return None
+    U = sparse.triu(adj, format="coo")
+    return igraph.Graph(n=adj.shape[0], edges=np.column_stack([U.row, U.col]), directed=False)
+
+
+def top_edge_subgraph(G: nx.Graph, soa: GraphSoA, rows, max_edges: int = 2500) -> nx.Graph:
+    """Subgraph induced by the nodes at `rows`, reduced to its `max_edges` strongest edges.
+
+    The induced edges and weights are read off the CSR arrays; only the kept edges become
+    NetworkX objects (below the cap, the plain induced subgraph is copied). Weight ties at the
+    cutoff go to the earlier edge in graph order.
+    """
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    inside = np.zeros(len(soa.ids), dtype=bool)
+    inside[rows] = True
+    A = soa.adj[rows]  # row slice; each row keeps its adjacency order
+    src = np.repeat(rows, np.diff(A.indptr))
+    # each undirected edge once, from its lower row (the order G.edges reports it in)
+    keep = inside[A.indices] & (A.indices >= src)
+    if np.count_nonzero(keep) <= max_edges:
+        return G.subgraph(soa.ids[rows].tolist()).copy()
+    src, dst, w = src[keep], A.indices[keep], A.data[keep]
+    top = _top_k_indices(w, max_edges)
+    return _graph_from_edges(G, zip(soa.ids[src[top]].tolist(), soa.ids[dst[top]].tolist(), w[top].tolist()))
 
 
 @st.cache_resource(show_spinner=False)
-def build_graph_cached(json_path: str, gap_minutes: int) -> Tuple[nx.Graph, dict]:
+def build_graph_cached(json_path: str, gap_minutes: int) -> Tuple[nx.Graph, dict, GraphSoA]:
     events = load_events(json_path)
     events, _ = assign_sessions(events, gap_minutes=gap_minutes)
     G = build_history_graph(events)
     stats = basic_graph_stats(G)
-    return G, stats
+    return G, stats, build_graph_soa(G)
+
+
+# node_to_comm.json as parallel columns: (node ids object array, int32 community ids)
+NodeComm = Tuple[np.ndarray, np.ndarray]
 
 
 @st.cache_data(show_spinner=False)
-def load_phase1_artifacts(artifacts_dir: str) -> Tuple[List[dict], Dict[str, int], dict]:
+def load_phase1_artifacts(artifacts_dir: str) -> Tuple[List[dict], NodeComm, dict]:
     ad = Path(artifacts_dir)
     comm_summaries = load_json(ad / "community_summaries.json")
     node_to_comm = load_json(ad / "node_to_comm.json")
     session_trails = load_json(ad / "session_trails.json")
-    # node_to_comm sometimes stores as str->int; ensure ints
-    node_to_comm2 = {k: int(v) for k, v in node_to_comm.items()}
-    return comm_summaries, node_to_comm2, session_trails
+    # Kept columnar (file order) instead of as a dict. node_to_comm sometimes stores as str->int;
+    # ensure ints. (No interning here: st.cache_data hands back an unpickled copy on every call.)
+    n = len(node_to_comm)
+    node_ids = np.fromiter(node_to_comm, dtype=object, count=n)
+    comm_ids = np.fromiter(map(int, node_to_comm.values()), dtype=np.int32, count=n)
+    return comm_summaries, (node_ids, comm_ids), session_trails
 
 
 def community_subgraph(
     G: nx.Graph,
-    node_to_comm: Dict[str, int],
+    soa: GraphSoA,
+    node_to_comm: NodeComm,
     community_id: int,
     include_sessions: bool = False,
     max_session_nodes: int = 60,
 ) -> nx.Graph:
-    nodes = [n for n, c in node_to_comm.items() if int(c) == int(community_id) and n in G]
-    H = G.subgraph(nodes).copy()
+    node_ids, comm_ids = node_to_comm
+    nodes = [n for n in node_ids[comm_ids == int(community_id)].tolist() if n in G]
+    # Read-only subgraph views until the end; only the final graph is materialized.
+    H = G.subgraph(nodes)
 
     # Optionally pull in session neighbors (for “why this exists”)
     if include_sessions:
@@ -183,33 +357,69 @@ def community_subgraph(
 
         # Keep only the most connected sessions into this community
         if sess:
-            # score by total edge weight into community nodes
-            scores = []
-            comm_nodes = set(H.nodes)
-            for s in sess:
-                tot = 0.0
-                for nb in G.neighbors(s):
-                    if nb in comm_nodes:
-                        tot += safe_float(G[s][nb].get("weight", 1.0), 1.0)
-                scores.append((s, tot))
-            scores.sort(key=lambda x: x[1], reverse=True)
-            keep_sessions = [s for s, _ in scores[:max_session_nodes]]
+            # score by total edge weight into community nodes: one sparse mat-vec of the
+            # sessions' adjacency rows against a community indicator vector
+            sess_list = list(sess)
+            in_comm = np.zeros(len(soa.ids), dtype=np.float64)
+            in_comm[[soa.row[n] for n in H.nodes]] = 1.0
+            scores = soa.adj[[soa.row[s] for s in sess_list]] @ in_comm
+            keep_sessions = [sess_list[i] for i in _top_k_indices(scores, max_session_nodes)]
 
             # union + induced subgraph
             nodes2 = set(H.nodes) | set(keep_sessions)
-            H = G.subgraph(nodes2).copy()
+            H = G.subgraph(nodes2)
 
     # Reduce clutter: keep only strongest edges
-    H = filter_to_top_edges(H, max_edges=2500)
-    return H
+    return top_edge_subgraph(G, soa, [soa.row[n] for n in H.nodes], max_edges=2500)
 
 
-def ego_subgraph(G: nx.Graph, center_node: str, radius: int = 2) -> nx.Graph:
+def ego_subgraph(G: nx.Graph, soa: GraphSoA, center_node: str, radius: int = 2) -> nx.Graph:
     if center_node not in G:
         return nx.Graph()
-    H = nx.ego_graph(G, center_node, radius=radius, center=True, undirected=True)
-    H = filter_to_top_edges(H, max_edges=2500)
-    return H
+    # nx.ego_graph's node set: igraph's BFS runs in C, NetworkX's is the fallback
+    if soa.ig is not None:
+        rows = soa.ig.neighborhood(soa.row[center_node], order=radius)
+    else:
+        rows = [soa.row[n] for n in nx.single_source_shortest_path_length(G, center_node, cutoff=radius)]
+    return top_edge_subgraph(G, soa, rows, max_edges=2500)
+
+
+# Cached views of the subgraph helpers. Every widget change reruns the script, so without these a
+# slider move re-extracts and re-filters (top-edge selection) the same subgraphs. Underscored
+# arguments are not hashed: `graph_key` (the inputs the cached graph was built from) and
+# `artifacts_dir` stand in for them, and "Load / Rebuild" clears these caches with the graph.
+@st.cache_data(show_spinner=False, max_entries=64)
+def community_subgraph_cached(
+    graph_key: Tuple[str, int],
+    artifacts_dir: str,
+    _G: nx.Graph,
+    _soa: GraphSoA,
+    _node_to_comm: NodeComm,
+    community_id: int,
+    include_sessions: bool = False,
+) -> nx.Graph:
+    return community_subgraph(_G, _soa, _node_to_comm, community_id, include_sessions=include_sessions)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def ego_subgraph_cached(
+    graph_key: Tuple[str, int], _G: nx.Graph, _soa: GraphSoA, center_node: str, radius: int = 2
+) -> nx.Graph:
+    return ego_subgraph(_G, _soa, center_node, radius=radius)
+
+
+# The rendered page, cached the same way: `view_key` names the (cached) subgraph `_H` came from,
+# so toggling an unrelated widget reuses the HTML instead of re-serializing the graph.
+@st.cache_data(show_spinner=False, max_entries=32)
+def pyvis_html_cached(
+    graph_key: Tuple[str, int],
+    view_key: tuple,
+    _H: nx.Graph,
+    height_px: int = 820,
+    max_nodes: int = 500,
+    _deg: Optional[Dict[str, float]] = None,
+) -> str:
+    return pyvis_html(_H, height_px=height_px, max_nodes=max_nodes, deg=_deg)
 
 
 # -----------------------------
@@ -251,7 +461,8 @@ if not Path(artifacts_dir).exists():
 
 with st.spinner("Loading artifacts + building graph…"):
     comm_summaries, node_to_comm, session_trails = load_phase1_artifacts(artifacts_dir)
-    G, stats = build_graph_cached(json_path, gap_minutes)
+    G, stats, soa = build_graph_cached(json_path, gap_minutes)
+    graph_key = (json_path, int(gap_minutes))
 
 # Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Communities", "Sessions", "Explorer"])
@@ -267,20 +478,31 @@ with tab1:
     c4.metric("Queries", f"{stats['queries']:,}")
 
     # Quick noise diagnostics
-    q_nodes = [n for n in G.nodes if isinstance(n, str) and n.startswith("q:")]
+    q_mask = soa.type_mask("query")
+    q_codes = soa.qclass_code[q_mask]
     q_df = pd.DataFrame({
-        "q": [strip_prefix(n) for n in q_nodes],
-        "qclass": [G.nodes[n].get("qclass", "") for n in q_nodes],
-        "qquality": [safe_float(G.nodes[n].get("qquality", 1.0), 1.0) for n in q_nodes],
-        "degree_w": [safe_float(G.degree(n, weight="weight"), 0.0) for n in q_nodes],
+        "q": [strip_prefix(n) for n in soa.ids[q_mask]],
+        # a handful of distinct classes: category dtype stores one small code per row
+        "qclass": pd.Categorical(np.asarray(soa.qclass_names, dtype=object)[q_codes]),
+        "qquality": soa.qquality[q_mask],
+        "degree_w": soa.degree_w[q_mask],
     })
+    # class counts straight from the codes; unset classes ("" / None) are shown as "(missing)"
+    qclass_counts = (
+        pd.Series(
+            np.bincount(q_codes, minlength=len(soa.qclass_names)),
+            index=[c or "(missing)" for c in soa.qclass_names],
+        )
+        .groupby(level=0)
+        .sum()
+    )
     colA, colB = st.columns([1, 1])
     with colA:
         st.subheader("Query quality distribution")
         st.bar_chart(q_df["qquality"].round(2).value_counts().sort_index())
     with colB:
         st.subheader("Query class counts")
-        st.bar_chart(q_df["qclass"].fillna("").replace("", "(missing)").value_counts())
+        st.bar_chart(qclass_counts[qclass_counts > 0].sort_values(ascending=False))
 
     st.subheader("Top weighted queries (debug)")
     topq = q_df.sort_values("degree_w", ascending=False).head(25)
@@ -318,26 +540,42 @@ with tab2:
     st.divider()
 
     st.subheader("Community subgraph (interactive)")
-    H = community_subgraph(G, node_to_comm, int(comm_id), include_sessions=include_sessions)
+    H = community_subgraph_cached(
+        graph_key, artifacts_dir, G, soa, node_to_comm, int(comm_id), include_sessions=include_sessions
+    )
 
+    # weighted degree of H, shared by the render's node cap and the table below
+    deg = dict(H.degree(weight="weight"))
     if H.number_of_nodes() == 0:
         st.info("No nodes in this community subgraph.")
     else:
-        html = pyvis_html(H, height_px=820, max_nodes=max_nodes)
+        html = pyvis_html_cached(
+            graph_key,
+            ("community", artifacts_dir, int(comm_id), include_sessions),
+            H,
+            height_px=820,
+            max_nodes=max_nodes,
+            _deg=deg,
+        )
         components.html(html, height=850, scrolling=True)
 
     st.subheader("Top nodes in this community (weighted degree)")
-    deg = dict(H.degree(weight="weight"))
+    # Only the 60 displayed rows are materialized (index = position in H, as before).
+    h_nodes = list(H.nodes)
+    # H.degree(weight=...) sums are plain numbers, so they convert in fromiter directly
+    deg_w = np.fromiter((deg.get(n, 0.0) for n in h_nodes), dtype=np.float64, count=len(h_nodes))
+    top = _top_k_indices(deg_w, 60)
+    top_nodes = [h_nodes[i] for i in top]
     df_nodes = pd.DataFrame({
-        "node": list(H.nodes),
-        "ntype": [node_type(H, n) for n in H.nodes],
-        "label": [strip_prefix(n) for n in H.nodes],
-        "qclass": [H.nodes[n].get("qclass", "") for n in H.nodes],
-        "qquality": [safe_float(H.nodes[n].get("qquality", 1.0), 1.0) for n in H.nodes],
-        "deg_w": [safe_float(deg.get(n, 0.0), 0.0) for n in H.nodes],
-    }).sort_values("deg_w", ascending=False)
+        "node": top_nodes,
+        "ntype": [node_type(H, n) for n in top_nodes],
+        "label": [strip_prefix(n) for n in top_nodes],
+        "qclass": [H.nodes[n].get("qclass", "") for n in top_nodes],
+        "qquality": soa.qquality[[soa.row[n] for n in top_nodes]],
+        "deg_w": deg_w[top],
+    }, index=top)
 
-    st.dataframe(df_nodes.head(60), use_container_width=True)
+    st.dataframe(df_nodes, use_container_width=True)
 
 # -----------------------------
 # Sessions
@@ -368,15 +606,17 @@ with tab3:
         st.write(trail.get("top_queries_utility", []))
 
         st.markdown("**Representative titles**")
-        for t in trail.get("representative_titles", [])[:10]:
-            st.write(f"- {t}")
+        # one markdown list (one element / delta to the browser) rather than a write per title
+        titles = trail.get("representative_titles", [])[:10]
+        if titles:
+            st.markdown("\n".join(f"- {t}" for t in titles))
 
     st.divider()
     st.subheader("Ego graph around this session (radius=1)")
     s_node = f"s:{sess_pick}"
     if s_node in G:
-        Hs = ego_subgraph(G, s_node, radius=1)
-        html = pyvis_html(Hs, height_px=700, max_nodes=min(max_nodes, 350))
+        Hs = ego_subgraph_cached(graph_key, G, soa, s_node, radius=1)
+        html = pyvis_html_cached(graph_key, ("ego", s_node, 1), Hs, height_px=700, max_nodes=min(max_nodes, 350))
         components.html(html, height=740, scrolling=True)
     else:
         st.info("Session node not found in graph (did you rebuild with same sessionization gap?).")
@@ -387,22 +627,13 @@ with tab3:
 with tab4:
     st.subheader("Node explorer (ego graph)")
 
-    # Provide a searchable list of nodes (can be heavy; keep it reasonable)
-    # Prefer domain+query nodes for UX
-    dq_nodes = [n for n in G.nodes if isinstance(n, str) and (n.startswith("d:") or n.startswith("q:"))]
+    # Searchable domain+query nodes (preferred for UX); the index is built with the cached graph
+    dq_nodes = soa.dq_nodes
     # Show a text input + best-effort match
     query = st.text_input("Search for a node (type part of domain or query text)", value="")
 
     # Create suggestions
-    suggestions = []
-    qlow = query.strip().lower()
-    if qlow:
-        for n in dq_nodes[:200000]:  # safety cap
-            lab = strip_prefix(n).lower()
-            if qlow in lab:
-                suggestions.append(n)
-            if len(suggestions) >= 80:
-                break
+    suggestions = soa.search_dq(query.strip().lower(), limit=80)
 
     pick = st.selectbox(
         "Pick a node to inspect",
@@ -418,20 +649,24 @@ with tab4:
             f"qquality={safe_float(G.nodes[pick].get('qquality', 1.0),1.0):.2f}"
         )
 
-    H = ego_subgraph(G, pick, radius=radius)
+    H = ego_subgraph_cached(graph_key, G, soa, pick, radius=radius)
     if H.number_of_nodes() == 0:
         st.info("Nothing to show.")
     else:
-        html = pyvis_html(H, height_px=820, max_nodes=max_nodes)
+        html = pyvis_html_cached(graph_key, ("ego", pick, radius), H, height_px=820, max_nodes=max_nodes)
         components.html(html, height=850, scrolling=True)
 
     st.subheader("Top neighbors (by edge weight)")
-    neigh = []
-    for nb in G.neighbors(pick):
-        w = safe_float(G[pick][nb].get("weight", 1.0), 1.0)
-        neigh.append((w, nb, node_type(G, nb)))
-    neigh.sort(reverse=True, key=lambda x: x[0])
-    dfn = pd.DataFrame(
-        [{"weight": w, "node": nb, "ntype": t, "label": strip_prefix(nb)} for (w, nb, t) in neigh[:60]]
-    )
+    # pick's adjacency row (neighbor order) straight from the CSR arrays, already float64
+    r = soa.row[pick]
+    lo, hi = soa.adj.indptr[r], soa.adj.indptr[r + 1]
+    top = _top_k_indices(soa.adj.data[lo:hi], 60)
+    nb_rows = soa.adj.indices[lo:hi][top]
+    nbs = soa.ids[nb_rows].tolist()
+    dfn = pd.DataFrame({
+        "weight": soa.adj.data[lo:hi][top],
+        "node": nbs,
+        "ntype": np.asarray(soa.ntype_names, dtype=object)[soa.ntype_code[nb_rows]],
+        "label": [strip_prefix(nb) for nb in nbs],
+    })
     st.dataframe(dfn, use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Make the `src` package importable when pytest runs from the repo root or scripts/.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,167 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from src.graph.build_graph import _tile_pairs, _top_k_per_session, build_history_graph
+from src.graph.communities import build_domain_query_projection
+from src.ingest.parse_takeout import Event
+from src.ingest.sessionize import assign_sessions
+
+# Expected values below are the output of the original per-session loop implementation
+# (dict/Counter accumulation) on the same events; the array version must match bit for bit.
+
+T0 = datetime(2024, 1, 5, 8, 0, tzinfo=timezone.utc)
+
+# (minutes after T0, domain, query): three sessions (30-minute gap), hub domains, a
+# low-quality query ("12") and queries/domains shared across sessions
+TOY_ROWS = [
+    (0, 'google.com', 'hiking boots'),
+    (2, 'rei.com', ''),
+    (3, 'rei.com', 'hiking boots'),
+    (5, 'trailforks.com', 'trail maps near me'),
+    (6, 'google.com', 'trail maps near me'),
+    (8, 'rei.com', ''),
+    (60, 'google.com', 'python dataclass slots'),
+    (61, 'docs.python.org', ''),
+    (62, 'docs.python.org', 'python dataclass slots'),
+    (63, 'stackoverflow.com', 'numpy lexsort'),
+    (64, 'stackoverflow.com', ''),
+    (65, 'google.com', '12'),
+    (130, 'google.com', 'hiking boots'),
+    (131, 'rei.com', ''),
+    (132, 'youtube.com', 'trail running shoes'),
+    (133, 'trailforks.com', 'trail maps near me'),
+    (134, 'rei.com', 'trail running shoes'),
+]
+
+
+def _toy_graph():
+    events = [
+        Event(
+            id=f"evt_{i}",
+            time=T0 + timedelta(minutes=m),
+            title="",
+            title_url=None,
+            event_type="search" if q else "visit",
+            query=q,
+            url=None,
+            domain=d,
+            subtitles=[],
+        )
+        for i, (m, d, q) in enumerate(TOY_ROWS)
+    ]
+    events, _ = assign_sessions(events, gap_minutes=30)
+    return build_history_graph(events)
+
+
+def _edges(G, etype=None):
+    return sorted(
+        (min(u, v), max(u, v), d["weight"]) for u, v, d in G.edges(data=True) if etype is None or d["etype"] == etype
+    )
+
+
+EXPECTED_DOMAIN_QUERY = [
+    ('d:docs.python.org', 'q:numpy lexsort', 0.9409815354041727),
+    ('d:docs.python.org', 'q:python dataclass slots', 2.015308233614269),
+    ('d:rei.com', 'q:hiking boots', 1.3739700887840134),
+    ('d:rei.com', 'q:trail maps near me', 1.5061324435179535),
+    ('d:rei.com', 'q:trail running shoes', 1.5147702048889278),
+    ('d:stackoverflow.com', 'q:numpy lexsort', 0.9409815354041727),
+    ('d:stackoverflow.com', 'q:python dataclass slots', 2.015308233614269),
+    ('d:trailforks.com', 'q:hiking boots', 0.9159800591893422),
+    ('d:trailforks.com', 'q:trail maps near me', 1.0040882956786357),
+    ('d:trailforks.com', 'q:trail running shoes', 0.7573851024444639),
+]
+
+
+def test_domain_query_weights_match_baseline():
+    G = _toy_graph()
+    assert _edges(G, "domain-query") == EXPECTED_DOMAIN_QUERY
+    assert _edges(build_domain_query_projection(G)) == EXPECTED_DOMAIN_QUERY
+
+
+EXPECTED_NODES = {
+    'd:docs.python.org': {'ntype': 'domain'},
+    'd:google.com': {'ntype': 'domain'},
+    'd:rei.com': {'ntype': 'domain'},
+    'd:stackoverflow.com': {'ntype': 'domain'},
+    'd:trailforks.com': {'ntype': 'domain'},
+    'd:youtube.com': {'ntype': 'domain'},
+    'q:hiking boots': {'ntype': 'query', 'psignal': 0.37490853387674844, 'qclass': 'interest', 'qquality': 0.8500000000000001},
+    'q:numpy lexsort': {'ntype': 'query', 'psignal': 0.4926247319354846, 'qclass': 'interest', 'qquality': 0.8500000000000001},
+    'q:python dataclass slots': {'ntype': 'query', 'psignal': 0.5010627221438098, 'qclass': 'interest', 'qquality': 0.9000000000000001},
+    'q:trail maps near me': {'ntype': 'query', 'psignal': 0.3969619770459689, 'qclass': 'interest', 'qquality': 0.9000000000000001},
+    'q:trail running shoes': {'ntype': 'query', 'psignal': 0.4922796328186031, 'qclass': 'interest', 'qquality': 0.9000000000000001},
+    's:s0000': {'ntype': 'session'},
+    's:s0001': {'ntype': 'session'},
+    's:s0002': {'ntype': 'session'},
+}
+
+EXPECTED_EDGES = [
+    ('d:docs.python.org', 'q:numpy lexsort', 'domain-query', 0.9409815354041727),
+    ('d:docs.python.org', 'q:python dataclass slots', 'domain-query', 2.015308233614269),
+    ('d:docs.python.org', 's:s0001', 'session-domain', 1.6741010691782268),
+    ('d:google.com', 's:s0000', 'session-domain', 0.16479184330021643),
+    ('d:google.com', 's:s0001', 'session-domain', 0.16479184330021643),
+    ('d:google.com', 's:s0002', 'session-domain', 0.1039720770839918),
+    ('d:rei.com', 'q:hiking boots', 'domain-query', 1.3739700887840134),
+    ('d:rei.com', 'q:trail maps near me', 'domain-query', 1.5061324435179535),
+    ('d:rei.com', 'q:trail running shoes', 'domain-query', 1.5147702048889278),
+    ('d:rei.com', 's:s0000', 'session-domain', 1.6065957563595703),
+    ('d:rei.com', 's:s0002', 'session-domain', 1.2731970138238309),
+    ('d:stackoverflow.com', 'q:numpy lexsort', 'domain-query', 0.9409815354041727),
+    ('d:stackoverflow.com', 'q:python dataclass slots', 'domain-query', 2.015308233614269),
+    ('d:stackoverflow.com', 's:s0001', 'session-domain', 1.6741010691782268),
+    ('d:trailforks.com', 'q:hiking boots', 'domain-query', 0.9159800591893422),
+    ('d:trailforks.com', 'q:trail maps near me', 'domain-query', 1.0040882956786357),
+    ('d:trailforks.com', 'q:trail running shoes', 'domain-query', 0.7573851024444639),
+    ('d:trailforks.com', 's:s0000', 'session-domain', 0.8032978781797852),
+    ('d:trailforks.com', 's:s0002', 'session-domain', 0.8032978781797852),
+    ('d:youtube.com', 's:s0002', 'session-domain', 0.17604002917172198),
+    ('q:hiking boots', 's:s0000', 'session-query', 0.6011439354294834),
+    ('q:hiking boots', 's:s0002', 'session-query', 0.3792795950415001),
+    ('q:numpy lexsort', 's:s0001', 'session-query', 0.5926502802801612),
+    ('q:python dataclass slots', 's:s0001', 'session-query', 1.0058839249286893),
+    ('q:trail maps near me', 's:s0000', 'session-query', 0.6589680457859917),
+    ('q:trail maps near me', 's:s0002', 'session-query', 0.41576254673922064),
+    ('q:trail running shoes', 's:s0002', 'session-query', 0.9941209015446762),
+]
+
+
+def test_history_graph_matches_baseline():
+    G = _toy_graph()
+    assert {n: dict(sorted(a.items())) for n, a in G.nodes(data=True)} == EXPECTED_NODES
+    assert sorted((min(u, v), max(u, v), d["etype"], d["weight"]) for u, v, d in G.edges(data=True)) == EXPECTED_EDGES
+
+
+def test_tile_pairs_matches_nested_loops():
+    rng = random.Random(0)
+    n_outer = [rng.randint(1, 5) for _ in range(20)]
+    n_inner = [rng.randint(1, 4) for _ in range(20)]
+    expected_outer, expected_inner = [], []
+    o0 = i0 = 0
+    for no, ni in zip(n_outer, n_inner):
+        for o in range(no):
+            for i in range(ni):
+                expected_outer.append(o0 + o)
+                expected_inner.append(i0 + i)
+        o0 += no
+        i0 += ni
+    outer, inner = _tile_pairs(np.asarray(n_outer, dtype=np.int64), np.asarray(n_inner, dtype=np.int64))
+    assert outer.tolist() == expected_outer
+    assert inner.tolist() == expected_inner
+
+
+def test_top_k_per_session_matches_most_common():
+    rng = random.Random(0)
+    ctrs = {}
+    for s in range(30):
+        ctr = Counter()
+        for _ in range(rng.randint(0, 25)):
+            ctr[f"item{rng.randint(0, 12)}"] += 1  # small counts, so many ties
+        ctrs[f"s{s:04d}"] = ctr
+    for k in (1, 3, 10):
+        assert _top_k_per_session(ctrs, k) == {s: ctr.most_common(k) for s, ctr in ctrs.items()}
+    assert _top_k_per_session({}, 10) == {}
@@ -0,0 +1,51 @@
+import networkx as nx
+
+from src.graph.communities import summarize_communities, summarize_topic_communities
+
+# Expected values below are the output of the original NetworkX implementation
+# (G.subgraph(...).degree(weight="weight") per community).
+
+
+def _small_graph() -> nx.Graph:
+    G = nx.Graph()
+    G.add_node("d:example.com", ntype="domain")
+    G.add_node("d:other.org", ntype="domain")
+    G.add_node("q:hiking boots", ntype="query", qclass="interest", qquality=1.0)
+    G.add_node("q:trail maps", ntype="query", qclass="interest", qquality=1.0)
+    G.add_edge("d:example.com", "q:hiking boots", weight=2.0, etype="domain-query")
+    G.add_edge("d:other.org", "q:hiking boots", weight=1.0, etype="domain-query")
+    G.add_edge("d:other.org", "q:trail maps", weight=3.0, etype="domain-query")
+    return G
+
+
+def test_summarize_communities_matches_baseline():
+    node_to_comm = {"d:example.com": 0, "d:other.org": 0, "q:hiking boots": 0, "q:trail maps": 0}
+    # both queries have weighted degree 3.0: the tie keeps node_to_comm order
+    expected = [
+        {
+            "community_id": 0,
+            "size": 4,
+            "top_domains": ["other.org", "example.com"],
+            "top_queries": ["hiking boots", "trail maps"],
+        }
+    ]
+    assert summarize_communities(_small_graph(), node_to_comm) == expected
+    assert summarize_topic_communities(_small_graph(), node_to_comm) == expected
+
+
+def test_summarize_communities_members_missing_from_graph():
+    # members absent from G are still summarized, with zero weighted degree
+    expected = [{"community_id": 0, "size": 1, "top_domains": ["example.com"], "top_queries": []}]
+    assert summarize_communities(nx.Graph(), {"d:example.com": 0}) == expected
+    assert summarize_topic_communities(nx.Graph(), {"d:example.com": 0}) == expected
+
+
+def test_summarize_communities_empty_node_to_comm():
+    assert summarize_communities(_small_graph(), {}) == []
+    assert summarize_topic_communities(_small_graph(), {}) == []
+
+
+def test_summarize_communities_only_singletons():
+    node_to_comm = {"d:example.com": -1, "q:hiking boots": -1}
+    assert summarize_communities(_small_graph(), node_to_comm) == []
+    assert summarize_topic_communities(_small_graph(), node_to_comm) == []
@@ -0,0 +1,107 @@
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+from src.ingest import parse_takeout as pt
+
+
+def _slow_clean_redirect(url: str) -> str:
+    """The general urlparse/parse_qs path, which the www.google.com/url fast path must match."""
+    url = url.strip()
+    u = urlparse(url)
+    if "google" in (u.netloc or "").lower() and u.path.startswith("/url"):
+        qs = parse_qs(u.query)
+        for key in ("q", "url"):
+            if key in qs and qs[key]:
+                return unquote(qs[key][0])
+    return url
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.google.com/url?q=https://example.com/a%3Fb%3D1&usg=AOvVaw",
+        "http://www.google.com/url?q=https://example.com/",
+        "https://www.google.com/url?url=https://example.com/x&sa=t",
+        "https://www.google.com/url?q=&url=https://example.com/fallback",
+        "https://www.google.com/url?sa=t&q=hiking+boots%20sale",
+        "https://www.google.com/url?q=https%253A%252F%252Fexample.com%252Fdouble",
+        "https://www.google.com/url?q=https://example.com/#frag",
+        "https://www.google.com/url?%71=https://example.com/encoded-key",
+        "https://www.google.com/url?sa=t",
+        "  https://www.google.com/url?q=https://example.com/padded  ",
+        "https://www.google.co.uk/url?q=https://example.com/uk",
+        "https://example.com/url?q=https://not-google.com/",
+    ],
+)
+def test_clean_redirect_url_matches_slow_path(url):
+    assert pt._clean_redirect_url(url) == _slow_clean_redirect(url)
+
+
+def _slow_parse_time(s: str):
+    """The general path: rewrite 'Z' to '+00:00', default naive times to UTC, convert to UTC."""
+    dt = pt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=pt.timezone.utc)
+    return dt.astimezone(pt.timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        "2024-01-05T08:29:34.280Z",
+        "2024-01-05T08:29:34Z",
+        "2024-01-05T08:29:34.123456Z",
+        "2024-06-23T22:21:50.431+02:00",
+        "2024-06-23T22:21:50",
+    ],
+)
+def test_parse_time_matches_slow_path(s):
+    a, b = pt._parse_time(s), _slow_parse_time(s)
+    assert a == b
+    assert a.utcoffset() == b.utcoffset()
+    assert a.isoformat() == b.isoformat()
+
+
+@pytest.mark.parametrize("s", ["", "garbageZ", "Z", None, 1704443374])
+def test_parse_time_invalid_falls_back_to_epoch(s):
+    assert pt._parse_time(s) == pt.EPOCH_UTC
+
+
+def _fixture_rows(n: int):
+    rows = []
+    for i in range(n):
+        row = {
+            "header": "Search",
+            # repeated timestamps check that chunking keeps the stable time order
+            "time": f"2024-01-05T08:{(n - i) // 3 % 60:02d}:00.000Z",
+            "products": ["Search"],
+        }
+        if i % 3 == 0:
+            row["title"] = f"Searched for Query {i % 7}"
+            row["titleUrl"] = f"https://www.google.com/search?q=query+{i % 7}"
+        elif i % 3 == 1:
+            row["title"] = f"Visited https://site{i % 5}.example.com/page"
+            row["titleUrl"] = f"https://www.google.com/url?q=https://site{i % 5}.example.com/page&usg=x"
+        else:
+            row["title"] = "Viewed something"
+            row["subtitles"] = [{"name": "Channel"}, "plain"]
+        if i % 4:  # rows without an id get the row-number fallback id
+            row["id"] = f"row-{i}"
+        rows.append(row)
+    rows.insert(10, "not a dict")
+    return rows
+
+
+def test_load_events_workers_match_serial(tmp_path, monkeypatch):
+    import json
+
+    path = tmp_path / "history.json"
+    path.write_text(json.dumps(_fixture_rows(120)), encoding="utf-8")
+    serial = pt.load_events(str(path), workers=1)
+
+    monkeypatch.setattr(pt, "_PARALLEL_MIN_ROWS", 1)
+    parallel = pt.load_events(str(path), workers=3)
+
+    assert len(serial) == 120
+    assert [e.to_dict() for e in parallel] == [e.to_dict() for e in serial]
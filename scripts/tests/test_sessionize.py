@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from src.ingest.parse_takeout import Event
+from src.ingest.sessionize import assign_sessions
+
+T0 = datetime(2024, 1, 5, 8, 0, tzinfo=timezone.utc)
+
+
+def _events():
+    # minutes after T0: a 40-minute gap after the second event, a 20-minute gap after the third
+    offsets = [0, 5, 45, 65]
+    return [
+        Event(
+            id=f"evt_{i}",
+            time=T0 + timedelta(minutes=m),
+            title=f"Searched for q{i}",
+            title_url=None,
+            event_type="search",
+            query=f"q{i}",
+            url=None,
+            domain="",
+            subtitles=[],
+        )
+        for i, m in enumerate(offsets)
+    ]
+
+
+def test_assign_sessions_updates_events_in_place():
+    events = _events()
+    out, ranges = assign_sessions(events, gap_minutes=30)
+    assert [e.id for e in events] == ["s0000:evt_0", "s0000:evt_1", "s0001:evt_2", "s0001:evt_3"]
+    assert [e.session_id for e in events] == ["s0000", "s0000", "s0001", "s0001"]
+    assert all(a is b for a, b in zip(out, events))
+    assert out is not events
+    assert ranges == [("s0000", 0, 2), ("s0001", 2, 4)]
+    assert events[0].to_dict()["session_id"] == "s0000"
+
+
+def test_assign_sessions_rerun_replaces_prefix():
+    events = _events()
+    assign_sessions(events, gap_minutes=30)
+    out, ranges = assign_sessions(events, gap_minutes=10)
+    fresh, fresh_ranges = assign_sessions(_events(), gap_minutes=10)
+    assert [e.id for e in out] == [e.id for e in fresh]
+    assert [e.session_id for e in out] == [e.session_id for e in fresh]
+    assert ranges == fresh_ranges
+    assert [e.id for e in out] == ["s0000:evt_0", "s0000:evt_1", "s0001:evt_2", "s0002:evt_3"]
+
+
+def test_assign_sessions_empty():
+    assert assign_sessions([], gap_minutes=30) == ([], [])
@@ -0,0 +1,132 @@
+import math
+from collections import Counter
+
+import networkx as nx
+import pytest
+
+from src.agent.config import SuitConfig
+from src.agent.suits import discover_suits
+from src.agent.text import build_tfidf, tokens
+
+QUERIES = [
+    # (query, psignal, {session: weight})
+    ("hiking boots", 0.9, {"s:0": 2.0, "s:1": 1.0, "s:2": 1.0}),
+    ("waterproof hiking boots", 0.8, {"s:1": 1.0, "s:3": 1.0}),
+    ("hiking trail maps", 0.7, {"s:2": 1.5}),
+    ("hiking boots sale", 0.85, {"s:3": 1.0}),
+    ("sourdough starter", 0.9, {"s:4": 2.0, "s:5": 1.0}),
+    ("sourdough bread recipe", 0.6, {"s:5": 1.0}),
+    ("bread flour", 0.5, {"s:4": 0.5}),
+    ("python asyncio tutorial", 0.4, {"s:6": 1.0}),
+    ("weather today", 0.2, {"s:0": 1.0}),
+]
+DOMAINS = [("rei.com", {"s:0": 1.0, "s:1": 2.0}), ("kingarthurbaking.com", {"s:4": 1.0})]
+
+
+def _fixture_graph() -> nx.Graph:
+    G = nx.Graph()
+    for i in range(7):
+        G.add_node(f"s:{i}", ntype="session")
+    for q, ps, sess in QUERIES:
+        G.add_node(f"q:{q}", ntype="query", psignal=ps, qquality=1.0)
+        for s, w in sess.items():
+            G.add_edge(s, f"q:{q}", weight=w)
+    for d, sess in DOMAINS:
+        G.add_node(f"d:{d}", ntype="domain")
+        for s, w in sess.items():
+            G.add_edge(s, f"d:{d}", weight=w)
+    return G
+
+
+def _dict_tfidf(items):
+    """The original dict-of-dicts TF-IDF, which the CSR rows must reproduce."""
+    N = max(1, len(items))
+    tfs = {item_id: Counter(tokens(text)) for item_id, text in items.items()}
+    df = Counter(tok for c in tfs.values() for tok in c)
+    idf = {tok: math.log((N + 1.0) / (dfi + 1.0)) + 1.0 for tok, dfi in df.items()}
+    return {
+        item_id: {tok: float(tf) / (float(sum(c.values())) or 1.0) * idf[tok] for tok, tf in c.items()}
+        for item_id, c in tfs.items()
+    }
+
+
+def test_build_tfidf_matches_dict_tfidf():
+    items = {f"q:{q}": q for q, _ps, _sess in QUERIES}
+    items["q:the of"] = "the of"  # only stopwords: an empty row
+    vecs, _idf, _extra_stop = build_tfidf(items)
+    expected = _dict_tfidf(items)
+    assert vecs.ids == list(items)
+    for item_id, want in expected.items():
+        row = vecs.row(item_id)
+        got = {vecs.terms[j]: float(x) for j, x in zip(row.indices, row.data)}
+        assert got == pytest.approx(want, rel=1e-12)
+        assert vecs.norms[vecs.index[item_id]] == pytest.approx(math.sqrt(sum(x * x for x in want.values())), rel=1e-12)
+    assert vecs.row("q:missing") is None
+
+
+# Output of the original per-seed cosine loop over dict centroids, on the fixture graph.
+EXPECTED_SUITS = [
+    (
+        "Boots Hiking_Boots Hiking",
+        ["q:hiking boots", "q:waterproof hiking boots", "q:hiking boots sale"],
+        7.0,
+        {
+            "boots": 0.326450800459, "boots_sale": 0.186117297949, "hiking": 0.291739581366,
+            "hiking_boots": 0.326450800459, "sale": 0.186117297949, "waterproof": 0.093058648974,
+            "waterproof_hiking": 0.093058648974,
+        },
+    ),
+    (
+        "Starter Sourdough_Starter Sourdough",
+        ["q:sourdough starter", "q:sourdough bread recipe"],
+        4.0,
+        {
+            "bread": 0.238629436112, "bread_recipe": 0.279175946923, "recipe": 0.279175946923,
+            "sourdough": 0.636345162965, "sourdough_bread": 0.279175946923,
+            "sourdough_starter": 0.465293244871, "starter": 0.465293244871,
+        },
+    ),
+    (
+        "Trail Maps Hiking_Trail Trail_Maps",
+        ["q:hiking trail maps"],
+        1.5,
+        {
+            "hiking": 0.375093747471, "hiking_trail": 0.558351893846, "maps": 0.558351893846,
+            "trail": 0.558351893846, "trail_maps": 0.558351893846,
+        },
+    ),
+    (
+        "Python Asyncio Tutorial Python_Asyncio",
+        ["q:python asyncio tutorial"],
+        1.0,
+        {
+            "asyncio": 0.558351893846, "asyncio_tutorial": 0.558351893846, "python": 0.558351893846,
+            "python_asyncio": 0.558351893846, "tutorial": 0.558351893846,
+        },
+    ),
+    (
+        "Flour Bread_Flour Bread",
+        ["q:bread flour"],
+        0.5,
+        {"bread": 0.795431453707, "bread_flour": 0.930586489743, "flour": 0.930586489743},
+    ),
+]
+
+
+def test_discover_suits_matches_baseline():
+    suits, vecs, _item_info = discover_suits(_fixture_graph(), SuitConfig(sim_threshold=0.2))
+    assert [s.suit_id for s in suits] == list(range(len(EXPECTED_SUITS)))
+    for s, (label, seed_item_ids, mass, centroid) in zip(suits, EXPECTED_SUITS):
+        assert (s.label, s.seed_item_ids, s.mass) == (label, seed_item_ids, mass)
+        got = {vecs.terms[j]: float(x) for j, x in zip(s.centroid.indices, s.centroid.data)}
+        assert got == pytest.approx(centroid, abs=1e-12)
+
+
+def test_discover_suits_max_suits():
+    suits, _vecs, _item_info = discover_suits(_fixture_graph(), SuitConfig(sim_threshold=0.2, max_suits=2))
+    assert [s.seed_item_ids for s in suits] == [seed_item_ids for _l, seed_item_ids, _m, _c in EXPECTED_SUITS[:2]]
+
+
+def test_discover_suits_empty_graph():
+    suits, vecs, item_info = discover_suits(nx.Graph(), SuitConfig())
+    assert suits == [] and len(vecs) == 0 and item_info == {}